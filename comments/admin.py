@@ -7,6 +7,8 @@ who wrote it, when it was written and when it was updated.
 """
 
 from django.contrib import admin
+from foraging_api.db import is_postgresql
+from .filters import search_by_field
 from .models import Comment
 
 
@@ -30,5 +32,21 @@ class CommentAdmin(admin.ModelAdmin):
 
     list_filter = ("owner", "created_at", "updated_at")
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Searches field by field on PostgreSQL, so the search uses the
+        trigram indexes, as the comment list does. Matching by id needs no
+        DISTINCT.
+        """
+        if not is_postgresql():
+            return super().get_search_results(request, queryset, search_term)
+        search_terms = search_term.split()
+        if not search_terms:
+            return queryset, False
+        return (
+            search_by_field(queryset, self.search_fields, search_terms),
+            False,
+        )
+
 
 admin.site.register(Comment, CommentAdmin)
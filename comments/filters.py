@@ -0,0 +1,64 @@
+"""
+Search backend for the comment list.
+
+DRF's SearchFilter ORs an "icontains" match on every search field into one
+WHERE clause. For comments that's the content plus the author's username
+and the post's name, so the two joins are made for every comment and the
+whole table is scanned, as no index can serve the OR across three tables.
+
+On PostgreSQL each search field is matched on its own instead, and the
+comment ids found are UNIONed together. Every branch of the union then
+reads its own trigram index, see migration 0007, and the authors and posts
+found lead into the comment table through its owner and post indexes. The
+SQLite development database has no trigram indexes, so it falls back to
+SearchFilter's standard search.
+"""
+
+from functools import reduce
+from rest_framework import filters
+from foraging_api.db import is_postgresql
+
+
+def matching_ids(queryset, search_fields, term):
+    """
+    Returns a subquery of the ids of rows of "queryset"'s model with "term"
+    in any of the "search_fields", one UNIONed branch per field.
+    """
+    model = queryset.model
+    branches = [
+        model.objects.filter(**{f"{field}__icontains": term})
+        .order_by()
+        .values("pk")
+        for field in search_fields
+    ]
+    return reduce(lambda union, branch: union.union(branch), branches)
+
+
+def search_by_field(queryset, search_fields, search_terms):
+    """
+    Filters "queryset" down to rows matching every one of "search_terms",
+    each term in any of the "search_fields".
+    """
+    for term in search_terms:
+        queryset = queryset.filter(
+            pk__in=matching_ids(queryset, search_fields, term)
+        )
+    return queryset
+
+
+class CommentSearchFilter(filters.SearchFilter):
+    """
+    Searches the view's "search_fields" field by field, so each can use its
+    trigram index, falling back to SearchFilter's search when the database
+    isn't PostgreSQL.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_postgresql():
+            return super().filter_queryset(request, queryset, view)
+
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+        return search_by_field(queryset, search_fields, search_terms)
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='0 for a comment on the post, 1 for a reply to it.', verbose_name='Depth'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, help_text='The top level comment of the thread this reply is in.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='comments.comment', verbose_name='Root Comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['root', 'created_at'], name='comment_root_created_idx'),
+        ),
+    ]
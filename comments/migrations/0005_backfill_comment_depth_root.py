@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:22
+
+from django.db import migrations, transaction
+from django.db.models import F, OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_depth_root(apps, schema_editor):
+    """
+    Fills in depth and root for the replies that already exist. Replies are
+    walked in primary key order, BATCH_SIZE at a time, each batch in its own
+    transaction so a large table isn't locked all at once.
+    Top level comments already have the right defaults, a depth of 0 and no
+    root.
+    """
+    Comment = apps.get_model('comments', 'Comment')
+    db_alias = schema_editor.connection.alias
+    replies = Comment.objects.using(db_alias).filter(
+        replying_comment__isnull=False
+    )
+    grandparent = Subquery(
+        Comment.objects.using(db_alias)
+        .filter(pk=OuterRef('replying_comment_id'))
+        .values('replying_comment_id')[:1]
+    )
+
+    last_pk = 0
+    while True:
+        pks = list(
+            replies.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not pks:
+            break
+        batch = Comment.objects.using(db_alias).filter(pk__in=pks)
+        with transaction.atomic(using=db_alias):
+            # Replies to a top level comment.
+            batch.filter(
+                replying_comment__replying_comment__isnull=True
+            ).update(depth=1, root=F('replying_comment'))
+            # Replies to replies can't be made, but are handled in case any
+            # predate that check.
+            batch.filter(
+                replying_comment__replying_comment__isnull=False
+            ).update(depth=2, root=grandparent)
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own.
+    atomic = False
+
+    dependencies = [
+        ('comments', '0004_comment_depth_root'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_depth_root, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants_blog', '0004_plantinfocuspost_main_plant_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('comments', '0005_backfill_comment_depth_root'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['plant_in_focus_post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['replying_comment', '-created_at'], name='comment_reply_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='owner',
+            field=models.ForeignKey(db_index=False, help_text='The user who made the comment.', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Owner'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='plant_in_focus_post',
+            field=models.ForeignKey(db_index=False, default=None, help_text='The post about the plant that this comment is related to.', on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='plants_blog.plantinfocuspost', verbose_name='Plant in Focus Posts'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='replying_comment',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='The main comment to which this comment is a reply.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='comments.comment', verbose_name='Main Comment'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from foraging_api.db import RunSQLOnPostgreSQL
+
+# Trigram indexes for the comment search, see comments/filters.py. They're
+# built on UPPER(column) because that's what "icontains" compares on
+# PostgreSQL, so the index serves '%term%' matches in any case.
+TRIGRAM_INDEXES = [
+    ('comment_content_trgm', 'comments_comment', 'content'),
+    ('auth_user_username_trgm', 'auth_user', 'username'),
+    ('plant_post_name_trgm', 'plants_blog_plantinfocuspost', 'main_plant_name'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0006_comment_access_path_indexes'),
+        ('plants_blog', '0004_plantinfocuspost_main_plant_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Skipped on databases other than PostgreSQL.
+        TrigramExtension(),
+    ] + [
+        RunSQLOnPostgreSQL(
+            sql=f'CREATE INDEX {name} ON {table} '
+            f'USING gin (UPPER({column}) gin_trgm_ops);',
+            reverse_sql=f'DROP INDEX IF EXISTS {name};',
+        )
+        for name, table, column in TRIGRAM_INDEXES
+    ]
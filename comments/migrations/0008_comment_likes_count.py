@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_likes_count(apps, schema_editor):
+    """
+    Fills in the new counter for comments that already exist.
+    """
+    Comment = apps.get_model('comments', 'Comment')
+    Like = apps.get_model('likes', 'Like')
+    counted = (
+        Like.objects.filter(comment=OuterRef('pk'))
+        .order_by()
+        .values('comment')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Comment.objects.update(
+        likes_count=Coalesce(Subquery(counted), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0007_comment_trigram_search'),
+        ('likes', '0002_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of likes on the comment.', verbose_name='Likes Count'),
+        ),
+        migrations.RunPython(
+            populate_likes_count, migrations.RunPython.noop
+        ),
+    ]
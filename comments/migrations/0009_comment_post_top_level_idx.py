@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0008_comment_likes_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['plant_in_focus_post', 'replying_comment', '-created_at'], name='comment_post_top_level_idx'),
+        ),
+    ]
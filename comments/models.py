@@ -5,9 +5,14 @@ For much of the code in this file, I've used the drf-api walkthrough projects
 with Code Institute as a guide.
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User
+from foraging_api.counters import adjust_count
+from foraging_api.db import fields_to_update
 from plants_blog.models import PlantInFocusPost
+from profiles.models import Profile
 
 
 class Comment(models.Model):
@@ -31,6 +36,8 @@ class Comment(models.Model):
         null=True,
         verbose_name="Owner",
         help_text="The user who made the comment.",
+        # Covered by the (owner, created_at, id) index.
+        db_index=False,
     )
 
     plant_in_focus_post = models.ForeignKey(
@@ -40,6 +47,8 @@ class Comment(models.Model):
         verbose_name="Plant in Focus Posts",
         help_text="The post about the plant that this comment is related to.",
         related_name="comments",  # Allows retrieval of all comments for a post
+        # Covered by the (plant_in_focus_post, created_at, id) index.
+        db_index=False,
     )
 
     replying_comment = models.ForeignKey(
@@ -50,6 +59,31 @@ class Comment(models.Model):
         related_name="replies",
         verbose_name="Main Comment",
         help_text="The main comment to which this comment is a reply.",
+        # Covered by the (replying_comment, created_at) index.
+        db_index=False,
+    )
+
+    # Stored when the comment is created, so checking a reply's depth, or
+    # fetching a whole thread, doesn't have to walk up the replying_comment
+    # chain. Top level comments have a depth of 0 and no root.
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Depth",
+        help_text="0 for a comment on the post, 1 for a reply to it.",
+    )
+
+    root = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="thread_comments",
+        # Covered by the (root, created_at) index.
+        db_index=False,
+        verbose_name="Root Comment",
+        help_text="The top level comment of the thread this reply is in.",
     )
 
     created_at = models.DateTimeField(
@@ -69,15 +103,67 @@ class Comment(models.Model):
         help_text="The text content of the comment.",
     )
 
+    # Stored like the post counters, and kept up to date by the Like signal
+    # receivers through the counter buffer, see foraging_api/counters.py.
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Likes Count",
+        help_text="Number of likes on the comment.",
+    )
+
+    # Columns only written with queries of their own, which a save of an
+    # existing comment leaves alone.
+    STORED_FIELDS = ("likes_count",)
+
     class Meta:
         """
         Meta class for specifying model options.
         Ensures that the newest comments are shown first.
+        The indexes match the newest first (created_at, id) ordering of the
+        lists, for all comments, one post's comments, one post's top-level
+        comments, one user's comments and one comment's replies, and fetching
+        a thread's replies in order. Each one leads with the columns the list
+        is filtered on, so a page is read straight off the index instead of
+        sorting every matching row. They also stand in for the foreign keys'
+        own single column indexes.
         """
 
         ordering = ["-created_at"]
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="comment_created_id_idx"
+            ),
+            models.Index(
+                fields=["owner", "-created_at", "-id"],
+                name="comment_owner_created_idx",
+            ),
+            models.Index(
+                fields=["plant_in_focus_post", "-created_at", "-id"],
+                name="comment_post_created_idx",
+            ),
+            # The threads the frontend shows are a post's comments that
+            # aren't replies, newest first. Reading them from the post's
+            # index means reading past all of the post's replies too.
+            models.Index(
+                fields=[
+                    "plant_in_focus_post",
+                    "replying_comment",
+                    "-created_at",
+                ],
+                name="comment_post_top_level_idx",
+            ),
+            models.Index(
+                fields=["replying_comment", "-created_at"],
+                name="comment_reply_created_idx",
+            ),
+            models.Index(
+                fields=["root", "created_at"],
+                name="comment_root_created_idx",
+            ),
+        ]
 
     def __str__(self):
         """
@@ -86,15 +172,104 @@ class Comment(models.Model):
         """
         return str(self.content)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers which comment a loaded comment replies to, so save() can
+        tell whether that's changed.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_replying_comment_id = instance.__dict__.get(
+            "replying_comment_id", DEFERRED
+        )
+        return instance
+
     def save(self, *args, **kwargs):
         """
         Custom save method with an added check to ensure replies can only go
         two levels deep. Restricting the replies to this depth avoids the
         nesting of comments becoming overly complex which would be harder to
         display.
+        The depth and root are taken from the comment being replied to, which
+        is already loaded when the reply comes through the serializer. They
+        are only worked out for new comments, or when the comment replied to
+        has changed, so editing a comment's content doesn't load its parent.
+        The comment is saved in a transaction with the counters its signal
+        receivers update. Saving an existing comment leaves out the stored
+        likes_count, so editing doesn't undo likes flushed in the meantime.
         """
-        if self.replying_comment:
-            if self.replying_comment.replying_comment:
-                raise ValueError("You can't reply to a reply")
+        if self._state.adding or self.replying_comment_id != getattr(
+            self, "_loaded_replying_comment_id", DEFERRED
+        ):
+            if self.replying_comment:
+                parent = self.replying_comment
+                if parent.depth > 0:
+                    raise ValueError("You can't reply to a reply")
+                self.depth = parent.depth + 1
+                self.root_id = parent.root_id or parent.pk
+            else:
+                self.depth = 0
+                self.root_id = None
+
+        if not self._state.adding:
+            kwargs["update_fields"] = fields_to_update(
+                self, self.STORED_FIELDS, kwargs.get("update_fields")
+            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_replying_comment_id = self.replying_comment_id
+
+
+def increment_post_comments_count(sender, instance, created, **kwargs):
+    """
+    Signal receiver that adds a newly created comment, or reply, to the
+    stored comments_count of the post it belongs to.
+    """
+    if created:
+        adjust_count(
+            PlantInFocusPost,
+            "comments_count",
+            1,
+            pk=instance.plant_in_focus_post_id,
+        )
+
+
+def decrement_post_comments_count(sender, instance, **kwargs):
+    """
+    Signal receiver that takes a deleted comment off the stored
+    comments_count of the post it belonged to.
+    """
+    adjust_count(
+        PlantInFocusPost,
+        "comments_count",
+        -1,
+        pk=instance.plant_in_focus_post_id,
+    )
+
+
+def increment_profile_comments_count(sender, instance, created, **kwargs):
+    """
+    Signal receiver that adds a new comment to its author's stored
+    total_comments_count.
+    """
+    if created and instance.owner_id:
+        adjust_count(
+            Profile, "total_comments_count", 1, owner_id=instance.owner_id
+        )
+
+
+def decrement_profile_comments_count(sender, instance, **kwargs):
+    """
+    Signal receiver that takes a deleted comment off its author's stored
+    total_comments_count.
+    """
+    if instance.owner_id:
+        adjust_count(
+            Profile, "total_comments_count", -1, owner_id=instance.owner_id
+        )
+
 
-        super().save(*args, **kwargs)
+post_save.connect(increment_post_comments_count, sender=Comment)
+post_delete.connect(decrement_post_comments_count, sender=Comment)
+post_save.connect(increment_profile_comments_count, sender=Comment)
+post_delete.connect(decrement_profile_comments_count, sender=Comment)
@@ -12,8 +12,17 @@ with Code Institute.
 """
 
 from django.contrib.humanize.templatetags.humanize import naturaltime
+from django.urls import reverse
 from rest_framework import serializers
+from foraging_api.images import (
+    AVATAR_SIZES,
+    ImageSrcsetField,
+    StorageURLField,
+)
+from foraging_api.pagination import CreatedAtCursorPagination
+from foraging_api.serializers import BatchedListSerializer
 from .models import Comment
+from .threads import load_threads, resolve_like_ids
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -26,8 +35,10 @@ class CommentSerializer(serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source="owner.username")
     is_owner = serializers.SerializerMethodField()
     profile_id = serializers.ReadOnlyField(source="owner.profile.id")
-    profile_image = serializers.ReadOnlyField(
-        source="owner.profile.image.url"
+    profile_image = StorageURLField(source="owner.profile.image")
+    # Avatar thumbnail URLs, keyed by size.
+    profile_image_srcset = ImageSrcsetField(
+        "image", AVATAR_SIZES, source="owner.profile"
     )
 
     created_at = serializers.SerializerMethodField()
@@ -35,6 +46,8 @@ class CommentSerializer(serializers.ModelSerializer):
     replies = serializers.SerializerMethodField()
 
     replies_count = serializers.ReadOnlyField()
+    # Only in reply preview mode, see get_fields.
+    replies_next = serializers.SerializerMethodField()
     likes_count = serializers.ReadOnlyField()
     like_id = serializers.SerializerMethodField()
 
@@ -46,9 +59,10 @@ class CommentSerializer(serializers.ModelSerializer):
 
     def validate_replying_comment(self, value):
         """
-        Ensure that replies don't go more than 2 levels deep.
+        Ensure that replies don't go more than 2 levels deep, from the stored
+        depth of the comment being replied to.
         """
-        if value and value.replying_comment:
+        if value and value.depth > 0:
             raise serializers.ValidationError(
                 "You can't reply to a comment that's already a reply."
             )
@@ -61,10 +75,42 @@ class CommentSerializer(serializers.ModelSerializer):
         """
         return self.context["request"].user == obj.owner
 
+    def get_fields(self):
+        """
+        Leaves "replies_next" out unless replies are being previewed, so
+        the response is unchanged for everyone else.
+        """
+        fields = super().get_fields()
+        if not self.context.get("reply_preview"):
+            fields.pop("replies_next")
+        return fields
+
+    def resolve_page(self, comments):
+        """
+        Loads the replies and authors of a whole page of comments before
+        they're serialized, then looks up the user's likes on all of them,
+        replies included, in one query, see comments/threads.py. The likes
+        are kept in the context, keyed by comment id, for get_like_id to
+        read, and the nested replies share them.
+        """
+        load_threads(comments, self.context.get("reply_preview"))
+        user = self.context["request"].user
+        if user.is_authenticated:
+            resolve_like_ids(
+                comments,
+                user,
+                self.context.setdefault("comment_like_ids", {}),
+            )
+
     def get_like_id(self, obj):
         """
         Returns the like ID if the current user has liked the comment.
+        Comments on a list page have the user's likes loaded already, a
+        single comment is looked up on its own.
         """
+        like_ids = self.context.get("comment_like_ids", {})
+        if obj.pk in like_ids:
+            return like_ids[obj.pk]
         user = self.context["request"].user
         if user.is_authenticated:
             like = obj.likes.filter(owner=user).first()
@@ -88,29 +134,60 @@ class CommentSerializer(serializers.ModelSerializer):
         Returns serialized replies instead of just reply IDs.
         This allows full reply details to be included in the response
         rather than requiring an extra API call to fetch them.
+        In reply preview mode only the newest replies are included, and
+        they're serialized without previewing their own replies.
         """
+        preview = getattr(obj, "reply_preview", None)
+        if preview is None:
+            return CommentSerializer(
+                obj.replies.all(),
+                many=True,
+                read_only=True,
+                context=self.context,
+            ).data
         return CommentSerializer(
-            obj.replies.all(), many=True, read_only=True, context=self.context
+            preview,
+            many=True,
+            read_only=True,
+            context={**self.context, "reply_preview": None},
         ).data
 
+    def get_replies_next(self, obj):
+        """
+        Returns a cursor link to the rest of the replies after the preview,
+        or None when the preview holds all of them.
+        """
+        preview = getattr(obj, "reply_preview", None)
+        if not preview or len(preview) >= obj.replies_count:
+            return None
+        return CreatedAtCursorPagination().get_link_after(
+            self.context["request"],
+            reverse("comments:comment_replies", args=[obj.pk]),
+            preview,
+        )
+
     class Meta:
         """
         Specifies the model to be used and the fields to be included.
         """
 
         model = Comment
+        # Loads the threads of a whole page of comments at once.
+        list_serializer_class = BatchedListSerializer
         fields = [
             "id",
             "owner",
             "is_owner",
             "profile_id",
             "profile_image",
+            "profile_image_srcset",
             "plant_in_focus_post",
             "created_at",
             "updated_at",
             "content",
             "replies",
             "replies_count",
+            "replies_next",
             "replying_comment",
             "likes_count",
             "like_id",
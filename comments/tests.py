@@ -2,10 +2,19 @@
 This file contains tests for the Comments app.
 """
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+from likes.models import Like
 from plants_blog.models import PlantInFocusPost
+from .filters import search_by_field
 from .models import Comment
+from .serializers import CommentSerializer
+from .views import CommentList
 
 
 class CommentModelTest(TestCase):
@@ -90,3 +99,617 @@ class CommentModelTest(TestCase):
             ).count(),
             0,
         )
+
+    def test_reply_depth_and_root_stored(self):
+        """
+        Tests that a reply stores its depth and the thread's root, taken
+        from the comment being replied to without reading anything else:
+        only the insert and the post's and author's counter updates are
+        run, in a savepoint.
+        """
+        self.assertEqual((self.comment.depth, self.comment.root), (0, None))
+        parent = Comment.objects.get(pk=self.comment.pk)
+        with self.assertNumQueries(5):
+            reply = Comment.objects.create(
+                owner=self.user,
+                plant_in_focus_post=self.post,
+                replying_comment=parent,
+                content="Reply",
+            )
+        self.assertEqual((reply.depth, reply.root_id), (1, self.comment.pk))
+        self.assertEqual(list(self.comment.thread_comments.all()), [reply])
+
+    def test_edit_does_not_load_parent(self):
+        """
+        Tests that editing a reply's content keeps its depth and root
+        without loading the comment it replies to: only the update is run,
+        in a savepoint.
+        """
+        Comment.objects.create(
+            owner=self.user,
+            plant_in_focus_post=self.post,
+            replying_comment=self.comment,
+            content="Reply",
+        )
+        reply = Comment.objects.get(replying_comment=self.comment)
+        reply.content = "Edited reply"
+        with self.assertNumQueries(3):
+            reply.save()
+        reply.refresh_from_db()
+        self.assertEqual((reply.depth, reply.root_id), (1, self.comment.pk))
+
+    def test_edit_keeps_likes_count(self):
+        """
+        Tests that editing a comment loaded before it was liked doesn't
+        write its old likes_count back.
+        """
+        stale = Comment.objects.get(pk=self.comment.pk)
+        Like.objects.create(owner=self.user, comment=self.comment)
+        stale.content = "Edited comment"
+        stale.save()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.content, "Edited comment")
+        self.assertEqual(self.comment.likes_count, 1)
+
+
+class CommentCursorPaginationTest(APITestCase):
+    """
+    Tests the opt-in cursor pagination on the comment list.
+    """
+
+    def setUp(self):
+        """
+        Creates a user, a plant post and fifteen comments on it.
+        """
+        self.user = User.objects.create_user(
+            username="test_user",
+            password="test_user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Test Plant",
+            main_plant_month="1",
+            main_plant_environment="Forest",
+            culinary_uses="Edible leaves",
+            history_and_folklore="Used in traditional medicine",
+            main_plant_parts_used="Leaves and stems",
+            owner=self.user,
+        )
+        self.comments = [
+            Comment.objects.create(
+                owner=self.user,
+                plant_in_focus_post=self.post,
+                content=f"Comment {number}",
+            )
+            for number in range(15)
+        ]
+
+    def test_cursor_pages_cover_every_comment_once(self):
+        """
+        Checks that following the "next" links returns every comment once,
+        newest first, without a total count.
+        """
+        response = self.client.get("/comments/?pagination=cursor")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 10)
+
+        ids = [comment["id"] for comment in response.data["results"]]
+        response = self.client.get(response.data["next"])
+        ids += [comment["id"] for comment in response.data["results"]]
+
+        self.assertIsNone(response.data["next"])
+        expected = [comment.id for comment in reversed(self.comments)]
+        self.assertEqual(ids, expected)
+
+    def test_page_number_pagination_is_default(self):
+        """
+        Checks that clients who don't opt in still get page numbers and the
+        total count.
+        """
+        response = self.client.get("/comments/")
+        self.assertEqual(response.data["count"], 15)
+
+
+class CommentConditionalGetTest(APITestCase):
+    """
+    Tests the ETag on a post's comment thread.
+    """
+
+    def setUp(self):
+        """
+        Creates a user, a plant post and a comment on it.
+        """
+        self.user = User.objects.create_user(
+            username="test_user",
+            password="test_user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Test Plant",
+            main_plant_month="1",
+            main_plant_environment="Forest",
+            culinary_uses="Edible leaves",
+            history_and_folklore="Used in traditional medicine",
+            main_plant_parts_used="Leaves and stems",
+            owner=self.user,
+        )
+        self.comment = Comment.objects.create(
+            owner=self.user,
+            plant_in_focus_post=self.post,
+            content="Test comment",
+        )
+        self.url = f"/comments/?plant_in_focus_post={self.post.id}"
+
+    def test_thread_etag_follows_replies_and_likes(self):
+        """
+        Checks that an unchanged thread gets a 304, and that a reply or a
+        like on a comment changes the ETag.
+        """
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Comment.objects.create(
+            owner=self.user,
+            plant_in_focus_post=self.post,
+            replying_comment=self.comment,
+            content="Reply",
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        Like.objects.create(owner=self.user, comment=self.comment)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CommentThreadLoadingTest(APITestCase):
+    """
+    Tests that a page of comment threads is loaded in a fixed number of
+    queries, without changing the response.
+    """
+
+    def setUp(self):
+        """
+        Creates two users and a post with three comments, each with two
+        replies, some of which the first user has liked.
+        """
+        self.user = User.objects.create_user(
+            username="test_user",
+            password="test_user_password",
+        )
+        self.other_user = User.objects.create_user(
+            username="other_user",
+            password="other_user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Test Plant",
+            main_plant_month="1",
+            main_plant_environment="Forest",
+            culinary_uses="Edible leaves",
+            history_and_folklore="Used in traditional medicine",
+            main_plant_parts_used="Leaves and stems",
+            owner=self.user,
+        )
+        for number in range(3):
+            comment = Comment.objects.create(
+                owner=self.user,
+                plant_in_focus_post=self.post,
+                content=f"Comment {number}",
+            )
+            Like.objects.create(owner=self.user, comment=comment)
+            for author in (self.user, self.other_user):
+                reply = Comment.objects.create(
+                    owner=author,
+                    plant_in_focus_post=self.post,
+                    replying_comment=comment,
+                    content=f"Reply to {number}",
+                )
+            Like.objects.create(owner=self.user, comment=reply)
+        self.url = f"/comments/?plant_in_focus_post={self.post.id}"
+
+    def serialize_one_by_one(self, comments):
+        """
+        Serializes the comments one at a time, without the thread loader,
+        as the list used to.
+        """
+        request = APIRequestFactory().get(self.url)
+        request.user = self.user
+        return [
+            CommentSerializer(comment, context={"request": request}).data
+            for comment in comments
+        ]
+
+    def test_thread_queries_are_bounded(self):
+        """
+        Checks that the page costs the same number of queries whatever the
+        number of comments and replies on it.
+        """
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(10):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 9)
+
+        comment = Comment.objects.filter(replying_comment=None).first()
+        for number in range(5):
+            Comment.objects.create(
+                owner=self.other_user,
+                plant_in_focus_post=self.post,
+                replying_comment=comment,
+                content=f"Another reply {number}",
+            )
+        with self.assertNumQueries(10):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_likes_looked_up_once_for_the_whole_tree(self):
+        """
+        Checks that the user's likes on the comments and all of their
+        nested replies come from a single query.
+        """
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        like_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('SELECT "likes_like"')
+        ]
+        self.assertEqual(len(like_queries), 1)
+
+        liked = set(
+            Like.objects.filter(owner=self.user).values_list(
+                "comment_id", flat=True
+            )
+        )
+        for comment in response.data["results"]:
+            for row in [comment] + comment["replies"]:
+                self.assertEqual(
+                    row["like_id"] is not None, row["id"] in liked
+                )
+
+    def test_response_is_unchanged(self):
+        """
+        Checks that the loaded threads serialize exactly as the comments
+        did one by one.
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        comments = CommentList.queryset.filter(plant_in_focus_post=self.post)
+        self.assertEqual(
+            JSONRenderer().render(response.data["results"]),
+            JSONRenderer().render(self.serialize_one_by_one(comments)),
+        )
+
+
+class CommentReplyPreviewTest(APITestCase):
+    """
+    Tests the reply preview mode of the comment list, and following its
+    cursor links through the reply list.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and a post with a comment that has five replies and
+        a comment that has one.
+        """
+        self.user = User.objects.create_user(
+            username="test_user",
+            password="test_user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Test Plant",
+            main_plant_month="1",
+            main_plant_environment="Forest",
+            culinary_uses="Edible leaves",
+            history_and_folklore="Used in traditional medicine",
+            main_plant_parts_used="Leaves and stems",
+            owner=self.user,
+        )
+        self.busy = Comment.objects.create(
+            owner=self.user, plant_in_focus_post=self.post, content="Busy"
+        )
+        self.replies = [
+            Comment.objects.create(
+                owner=self.user,
+                plant_in_focus_post=self.post,
+                replying_comment=self.busy,
+                content=f"Reply {number}",
+            )
+            for number in range(5)
+        ]
+        self.quiet = Comment.objects.create(
+            owner=self.user, plant_in_focus_post=self.post, content="Quiet"
+        )
+        self.quiet_reply = Comment.objects.create(
+            owner=self.user,
+            plant_in_focus_post=self.post,
+            replying_comment=self.quiet,
+            content="Only reply",
+        )
+        self.url = (
+            f"/comments/?plant_in_focus_post={self.post.id}"
+            "&owner__username=test_user&reply_preview=2"
+        )
+
+    def get_comment(self, response, comment):
+        return next(
+            row for row in response.data["results"] if row["id"] == comment.id
+        )
+
+    def test_preview_holds_newest_replies(self):
+        """
+        Checks that only the newest two replies are embedded, with the
+        total count and a link to the rest, and that following the link
+        returns the remaining replies.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        busy = self.get_comment(response, self.busy)
+        self.assertEqual(
+            [reply["id"] for reply in busy["replies"]],
+            [self.replies[4].id, self.replies[3].id],
+        )
+        self.assertEqual(busy["replies_count"], 5)
+        self.assertNotIn("replies_next", busy["replies"][0])
+
+        response = self.client.get(busy["replies_next"])
+        self.assertEqual(
+            [reply["id"] for reply in response.data["results"]],
+            [reply.id for reply in reversed(self.replies[:3])],
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_link_keeps_replies_created_together(self):
+        """
+        Checks that replies created at the same moment as the last reply
+        in the preview are still reached through the link, whether or not
+        the preview holds a reply from an earlier moment.
+        """
+        for tied in (self.replies[1:4], self.replies):
+            Comment.objects.filter(pk__in=[r.pk for r in tied]).update(
+                created_at=self.replies[0].created_at
+            )
+            response = self.client.get(self.url)
+            busy = self.get_comment(response, self.busy)
+            self.assertEqual(
+                [reply["id"] for reply in busy["replies"]],
+                [self.replies[4].id, self.replies[3].id],
+            )
+            response = self.client.get(busy["replies_next"])
+            self.assertEqual(
+                [reply["id"] for reply in response.data["results"]],
+                [reply.id for reply in reversed(self.replies[:3])],
+            )
+
+    def test_no_link_when_preview_holds_every_reply(self):
+        """
+        Checks that a comment whose replies all fit in the preview has no
+        link to more.
+        """
+        response = self.client.get(self.url)
+        quiet = self.get_comment(response, self.quiet)
+        self.assertEqual(
+            [reply["id"] for reply in quiet["replies"]],
+            [self.quiet_reply.id],
+        )
+        self.assertIsNone(quiet["replies_next"])
+
+    def test_preview_queries_are_bounded(self):
+        """
+        Checks that more replies don't cost more queries. The new replies
+        are by another user, so the page itself stays the same.
+        """
+        with self.assertNumQueries(9):
+            self.client.get(self.url)
+        other_user = User.objects.create_user(
+            username="other_user", password="other_user_password"
+        )
+        for number in range(20):
+            Comment.objects.create(
+                owner=other_user,
+                plant_in_focus_post=self.post,
+                replying_comment=self.quiet,
+                content=f"Another reply {number}",
+            )
+        with self.assertNumQueries(9):
+            response = self.client.get(self.url)
+        quiet = self.get_comment(response, self.quiet)
+        self.assertEqual(
+            (len(quiet["replies"]), quiet["replies_count"]), (2, 21)
+        )
+
+    def test_default_mode_has_no_preview_fields(self):
+        """
+        Checks that without "reply_preview" every reply is embedded and no
+        link is added.
+        """
+        response = self.client.get(
+            f"/comments/?plant_in_focus_post={self.post.id}"
+        )
+        busy = self.get_comment(response, self.busy)
+        self.assertEqual(len(busy["replies"]), 5)
+        self.assertNotIn("replies_next", busy)
+
+
+class CommentRowsTest(APITestCase):
+    """
+    Tests that the comment lists served from values() rows render exactly
+    what CommentSerializer renders for the same comments.
+    """
+
+    def setUp(self):
+        """
+        Creates two users and a post with a comment that has replies, a
+        comment whose author was deleted, and a comment by a user without
+        a profile.
+        """
+        self.user = User.objects.create_user(
+            username="test_user",
+            password="test_user_password",
+        )
+        self.other_user = User.objects.create_user(
+            username="other_user",
+            password="other_user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Test Plant",
+            main_plant_month="1",
+            main_plant_environment="Forest",
+            culinary_uses="Edible leaves",
+            history_and_folklore="Used in traditional medicine",
+            main_plant_parts_used="Leaves and stems",
+            owner=self.user,
+        )
+        self.comment = Comment.objects.create(
+            owner=self.user, plant_in_focus_post=self.post, content="Thread"
+        )
+        for number in range(3):
+            reply = Comment.objects.create(
+                owner=self.other_user,
+                plant_in_focus_post=self.post,
+                replying_comment=self.comment,
+                content=f"Reply {number}",
+            )
+        Like.objects.create(owner=self.user, comment=self.comment)
+        Like.objects.create(owner=self.user, comment=reply)
+        Comment.objects.create(
+            owner=None, plant_in_focus_post=self.post, content="Orphaned"
+        )
+        no_profile = User.objects.create_user(
+            username="no_profile", password="no_profile_password"
+        )
+        no_profile.profile.delete()
+        Comment.objects.create(
+            owner=no_profile, plant_in_focus_post=self.post, content="Bare"
+        )
+
+    def assertRendersAsSerializer(self, url, comments, **context):
+        """
+        Checks that the list at "url" renders byte for byte as
+        CommentSerializer renders "comments".
+        """
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        request = response.renderer_context["request"]
+        expected = CommentSerializer(
+            comments,
+            many=True,
+            context={"request": request, **context},
+        ).data
+        self.assertEqual(
+            JSONRenderer().render(response.data["results"]),
+            JSONRenderer().render(expected),
+        )
+        return response
+
+    def test_comment_list_matches_serializer(self):
+        """
+        Checks the comment list, anonymously and as a user with likes.
+        """
+        url = f"/comments/?plant_in_focus_post={self.post.id}"
+        comments = CommentList.queryset.filter(plant_in_focus_post=self.post)
+        self.assertRendersAsSerializer(url, comments)
+        self.client.force_authenticate(user=self.user)
+        response = self.assertRendersAsSerializer(url, comments)
+        rows = {row["content"]: row for row in response.data["results"]}
+        self.assertNotIn("owner", rows["Orphaned"])
+        self.assertIsNone(rows["Bare"]["profile_image"])
+        self.assertIsNotNone(rows["Thread"]["like_id"])
+
+    def test_reply_preview_matches_serializer(self):
+        """
+        Checks the comment list in reply preview mode, "replies_next"
+        links included.
+        """
+        self.client.force_authenticate(user=self.user)
+        comments = CommentList.queryset.filter(plant_in_focus_post=self.post)
+        self.assertRendersAsSerializer(
+            f"/comments/?plant_in_focus_post={self.post.id}&reply_preview=2",
+            comments,
+            reply_preview=2,
+        )
+
+    def test_reply_list_matches_serializer(self):
+        """
+        Checks the reply list, whose rows carry no counts.
+        """
+        self.client.force_authenticate(user=self.user)
+        self.assertRendersAsSerializer(
+            f"/comments/{self.comment.id}/replies/",
+            Comment.objects.filter(replying_comment=self.comment),
+        )
+
+
+class CommentSearchTest(APITestCase):
+    """
+    Tests the comment search, by content, author and post name.
+    """
+
+    def setUp(self):
+        """
+        Creates two users with a post each, and comments by each of them
+        on both posts.
+        """
+        self.nettle_fan = User.objects.create_user(
+            username="nettle_fan", password="nettle_fan_password"
+        )
+        self.forager = User.objects.create_user(
+            username="forager", password="forager_password"
+        )
+        self.comments = []
+        for name, owner in (
+            ("Nettle", self.nettle_fan),
+            ("Wild Garlic", self.forager),
+        ):
+            post = PlantInFocusPost.objects.create(
+                main_plant_name=name,
+                main_plant_month="4",
+                main_plant_environment="Woodland",
+                culinary_uses="Soup",
+                history_and_folklore="Folklore",
+                main_plant_parts_used="Leaves",
+                owner=owner,
+            )
+            for author in (self.nettle_fan, self.forager):
+                self.comments.append(
+                    Comment.objects.create(
+                        owner=author,
+                        plant_in_focus_post=post,
+                        content=f"{author.username} on {name}: lovely soup",
+                    )
+                )
+
+    def search(self, terms):
+        response = self.client.get("/comments/", {"search": terms})
+        return sorted(row["id"] for row in response.data["results"])
+
+    def test_search_matches_any_field(self):
+        """
+        Checks that a term matches the content, the author or the post's
+        name, and that every term has to match.
+        """
+        forager_on_nettle, forager_on_garlic = self.comments[1::2]
+        self.assertEqual(len(self.search("SOUP")), 4)
+        self.assertEqual(
+            self.search("garlic forager"), [forager_on_garlic.id]
+        )
+        self.assertEqual(
+            self.search("nettle forager"), [forager_on_nettle.id]
+        )
+        self.assertEqual(self.search("hemlock"), [])
+
+    def test_search_by_field_matches_search_filter(self):
+        """
+        Checks that the field by field search used on PostgreSQL finds the
+        same comments as the standard search.
+        """
+        search_fields = CommentList.search_fields
+        for terms in (["soup"], ["garlic", "forager"], ["nettle"], ["x"]):
+            found = search_by_field(
+                Comment.objects.all(), search_fields, terms
+            )
+            self.assertEqual(
+                sorted(found.values_list("id", flat=True)),
+                self.search(" ".join(terms)),
+            )
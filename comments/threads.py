@@ -0,0 +1,136 @@
+"""
+Loads comment threads for a page of comments in a fixed number of queries.
+
+CommentSerializer nests every comment's replies, and the replies' own
+"replies" lists, inside the comment. Serialized one by one, each of those
+rows ran its own queries for its replies, its author's profile and the
+requesting user's like. load_threads fetches the replies and profiles for
+the whole page up front, one query per level, and attaches them to the
+comments the way prefetch_related does, so the serializer reads them from
+memory and the response is unchanged. resolve_like_ids then finds the
+user's likes on every comment in the loaded threads with a single query.
+
+In reply preview mode only the newest few replies of each comment are
+loaded, as "reply_preview", so a comment with thousands of replies costs no
+more than one with a handful.
+"""
+
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
+from likes.models import Like
+from .models import Comment
+
+# Levels of replies nested below a comment. Replies can't be replied to,
+# so a reply's own "replies" list is the last, and always empty, level.
+REPLY_LEVELS = ("replies", "replies__replies")
+
+
+def preview_replies(comments, limit):
+    """
+    Returns the newest "limit" replies of each of "comments", picked with a
+    single windowed query over all of their replies.
+    """
+    if not comments:
+        return Comment.objects.none()
+    ranked = (
+        Comment.objects.filter(replying_comment__in=comments)
+        .annotate(
+            preview_rank=Window(
+                RowNumber(),
+                partition_by=[F("replying_comment_id")],
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .order_by()
+        .values("pk", "preview_rank")
+    )
+    sql, params = ranked.query.sql_with_params()
+    # A window function can't be filtered on in the query that computes
+    # it, so the ranked replies are filtered from a derived table.
+    # Ordered like the rank, so the last reply of a preview is the one the
+    # "replies_next" cursor follows on from.
+    return Comment.objects.filter(
+        pk__in=RawSQL(
+            f"SELECT id FROM ({sql}) ranked WHERE preview_rank <= %s",
+            (*params, limit),
+        )
+    ).order_by("-created_at", "-id")
+
+
+def thread_prefetches(comments, preview_limit=None):
+    """
+    Returns the Prefetch lookups that load the replies of a page of
+    comments with their authors' profiles. With "preview_limit", only the
+    newest replies are loaded, as "reply_preview".
+    """
+    replies = Comment.objects.select_related("owner__profile")
+    if preview_limit:
+        return [
+            Prefetch(
+                "replies",
+                queryset=preview_replies(
+                    comments, preview_limit
+                ).select_related("owner__profile"),
+                to_attr="reply_preview",
+            ),
+            Prefetch("reply_preview__replies", queryset=replies),
+        ]
+    return [Prefetch(level, queryset=replies) for level in REPLY_LEVELS]
+
+
+def load_threads(comments, preview_limit=None):
+    """
+    Attaches the replies and authors of "comments". Comments whose threads
+    are already loaded aren't fetched again.
+    """
+    prefetch_related_objects(
+        comments, *thread_prefetches(comments, preview_limit)
+    )
+
+
+def loaded_replies(comment):
+    """
+    Returns the replies load_threads attached to a comment, without running
+    a query for ones that weren't loaded.
+    """
+    preview = getattr(comment, "reply_preview", None)
+    if preview is not None:
+        return preview
+    if "replies" in getattr(comment, "_prefetched_objects_cache", {}):
+        return comment.replies.all()
+    return ()
+
+
+def thread_comment_ids(comments):
+    """
+    Returns the ids of "comments" and of every reply loaded below them.
+    """
+    ids = []
+    pending = list(comments)
+    while pending:
+        comment = pending.pop()
+        ids.append(comment.pk)
+        pending.extend(loaded_replies(comment))
+    return ids
+
+
+def resolve_like_ids(comments, user, like_ids):
+    """
+    Adds the id of "user"'s like on each comment in the loaded threads of
+    "comments" to the "like_ids" dict, keyed by comment id, with None for
+    the comments the user hasn't liked. It's one query for all of them, and
+    none at all once every comment is already in "like_ids", as it is for
+    the nested replies serialized after their page.
+    """
+    missing = [
+        pk for pk in thread_comment_ids(comments) if pk not in like_ids
+    ]
+    if not missing:
+        return
+    like_ids.update((pk, None) for pk in missing)
+    like_ids.update(
+        Like.objects.filter(owner=user, comment_id__in=missing)
+        .order_by()
+        .values_list("comment_id", "id")
+    )
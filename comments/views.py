@@ -8,28 +8,56 @@ RetrieveUpdateDestroyAPIView: Allows viewing, updating, and deleting comments.
 ListAPIView: Retrieves comment replies and comments by specific users.
 """
 
-from django.db.models import Count
-from rest_framework import generics, permissions, filters
+from rest_framework import generics, permissions
 from django_filters.rest_framework import DjangoFilterBackend
+from foraging_api.conditional import ConditionalGetMixin
+from foraging_api.db import subquery_count
+from foraging_api.pagination import OptionalCursorPaginationMixin
 from foraging_api.permissions import IsOwnerOrReadOnly
+from likes.models import user_like_id
+from .filters import CommentSearchFilter
 from .models import Comment
+from .rows import CommentRowsListMixin
 from .serializers import CommentSerializer, CommentDetailSerializer
 
+# Number of direct replies to each comment, counted from the index on
+# replying_comment.
+REPLIES_COUNT = subquery_count(Comment.objects.all(), "replying_comment")
 
-class CommentList(generics.ListCreateAPIView):
+
+class CommentList(
+    ConditionalGetMixin,
+    CommentRowsListMixin,
+    OptionalCursorPaginationMixin,
+    generics.ListCreateAPIView,
+):
     """
     Lists all comments and allows authenticated users to create new comments.
+    Supports cursor pagination with "?pagination=cursor".
+    With "?reply_preview=N" only the newest N replies (up to
+    MAX_REPLY_PREVIEW) are embedded in each comment, along with a
+    "replies_next" cursor link to the rest of them.
+    Responses carry an ETag, so a thread that hasn't changed since the
+    client last fetched it can be answered with a 304.
+    Listing is served from values() rows, see comments/rows.py.
     """
 
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-    queryset = Comment.objects.annotate(
-        replies_count=Count("replies", distinct=True),
-        likes_count=Count("likes", distinct=True),
-    ).order_by("-created_at")
-
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    # Authors and their profiles are joined in, the replies and likes are
+    # loaded for the whole page by the serializer. likes_count is stored on
+    # the comment. The replies are counted with a subquery per row rather
+    # than a grouped join, so the page can be read in order straight off
+    # the (created_at, id) indexes.
+    queryset = (
+        Comment.objects.select_related("owner__profile")
+        .annotate(replies_count=REPLIES_COUNT)
+        .order_by("-created_at")
+    )
+
+    # Searches through the trigram indexes on PostgreSQL.
+    filter_backends = [DjangoFilterBackend, CommentSearchFilter]
     filterset_fields = [
         "plant_in_focus_post",
         "replying_comment",
@@ -41,6 +69,62 @@ class CommentList(generics.ListCreateAPIView):
         "plant_in_focus_post__main_plant_name",
     ]
 
+    MAX_REPLY_PREVIEW = 20
+
+    def get_reply_preview(self):
+        """
+        Returns the number of replies to preview per comment from
+        "?reply_preview=N", or None to embed every reply.
+        """
+        try:
+            limit = int(self.request.query_params["reply_preview"])
+        except (KeyError, ValueError):
+            return None
+        return min(max(limit, 1), self.MAX_REPLY_PREVIEW)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["reply_preview"] = self.get_reply_preview()
+        return context
+
+    # Likes on the comments, and the authors' profiles, are embedded in the
+    # rows. The stored likes counts are read, rather than the likes
+    # counted, so the ETag changes when buffered likes are flushed to them.
+    # created_at is what cursor pagination pages the rows by.
+    validator_fields = (
+        "created_at",
+        "updated_at",
+        "likes_count",
+        "owner__profile__updated_at",
+    )
+
+    def get_validator_queryset(self):
+        """
+        Filters the plain comments table, as the validators don't need the
+        per-row counts annotated on the list queryset.
+        """
+        return self.filter_queryset(Comment.objects.order_by("-created_at"))
+
+    def get_validator_annotations(self):
+        if not self.request.user.is_authenticated:
+            return {}
+        return {"like_id": user_like_id(self.request.user, "comment")}
+
+    def get_validator_rows(self):
+        """
+        Adds the replies embedded in the page's comments, all of which have
+        one of them as their root, to the page's rows.
+        """
+        rows = super().get_validator_rows()
+        annotations = self.get_validator_annotations()
+        replies = (
+            Comment.objects.filter(root__in=[row["pk"] for row in rows])
+            .annotate(**annotations)
+            .order_by("pk")
+            .values("pk", *self.validator_fields, *annotations)
+        )
+        return rows + list(replies)
+
     def perform_create(self, serializer):
         """
         Assigns the current user as the owner of the comment.
@@ -63,15 +147,18 @@ class CommentDetail(generics.RetrieveUpdateDestroyAPIView):
 
     permission_classes = [IsOwnerOrReadOnly]
     serializer_class = CommentDetailSerializer
-    queryset = Comment.objects.annotate(
-        replies_count=Count("replies", distinct=True),
-        likes_count=Count("likes", distinct=True),
-    ).order_by("-created_at")
+    queryset = Comment.objects.annotate(replies_count=REPLIES_COUNT).order_by(
+        "-created_at"
+    )
 
 
-class CommentReplyList(generics.ListAPIView):
+class CommentReplyList(
+    CommentRowsListMixin, OptionalCursorPaginationMixin, generics.ListAPIView
+):
     """
-    Lists all replies to a specific comment.
+    Lists all replies to a specific comment, from values() rows.
+    Supports cursor pagination with "?pagination=cursor", which is what the
+    "replies_next" links of the reply previews use.
     """
 
     serializer_class = CommentSerializer
@@ -81,7 +168,11 @@ class CommentReplyList(generics.ListAPIView):
         Returns replies associated with a specific comment.
         """
         parent_comment_id = self.kwargs["pk"]
-        return Comment.objects.filter(replying_comment_id=parent_comment_id)
+        return (
+            Comment.objects.select_related("owner__profile")
+            .filter(replying_comment_id=parent_comment_id)
+            .order_by("-created_at")
+        )
 
 
 class CommentReplyDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -103,10 +194,13 @@ class CommentReplyDetail(generics.RetrieveUpdateDestroyAPIView):
         )
 
 
-class ProfileCommentsList(generics.ListAPIView):
+class ProfileCommentsList(
+    OptionalCursorPaginationMixin, generics.ListAPIView
+):
     """
     Lists all comments made by a specific user, allowing other authenticated
     users to see the comments made by a profile owner and their related posts.
+    Supports cursor pagination with "?pagination=cursor".
     """
 
     serializer_class = CommentSerializer
@@ -117,6 +211,8 @@ class ProfileCommentsList(generics.ListAPIView):
         Returns comments created by the user associated with given profile ID.
         """
         profile_id = self.kwargs.get("profile_id")
-        return Comment.objects.filter(owner__profile__id=profile_id).order_by(
-            "-created_at"
+        return (
+            Comment.objects.select_related("owner__profile")
+            .filter(owner__profile__id=profile_id)
+            .order_by("-created_at")
         )
@@ -58,6 +58,14 @@ class Course(models.Model):
         help_text="The maximum number of participants for the course.",
     )
 
+    # Automatically sets the date and time a course is updated. Used as the
+    # Last-Modified validator of the course list.
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Updated At",
+        help_text="When the course was last updated.",
+    )
+
     class Meta:
         # Courses to be displayed in admin panel, starting with most recent,
         # first.
@@ -2,6 +2,7 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
+from course_registrations.models import CourseRegistration
 from .models import Course
 
 
@@ -55,6 +56,33 @@ class CourseAPITest(TestCase):
                 self.course.title,
             )
 
+    def test_full_course_list_etag_follows_registrations(self):
+        """
+        Tests that the FullCourseList returns a 304 for an unchanged list,
+        and that a new confirmed registration, which changes the available
+        spaces, changes the ETag.
+        """
+        response = self.client.get("/courses/full-list/")
+        etag = response["ETag"]
+        response = self.client.get(
+            "/courses/full-list/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        CourseRegistration.objects.create(
+            course_title=self.course,
+            owner=self.admin_user,
+            email="admin@example.com",
+            phone="+447885144123",
+            ice_name="Emergency Contact",
+            ice_number="+447885422133",
+        )
+        response = self.client.get(
+            "/courses/full-list/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["available_spaces"], 9)
+
     def test_valid_course_creation(self):
         """
         Tests the CourseCreate view with valid data to ensure a new course can
@@ -16,6 +16,8 @@ glance.
 
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework import generics
+from django.db.models import Count, Q
+from foraging_api.conditional import ConditionalGetMixin
 from .models import Course
 from .serializers import CourseSerializer
 from django.utils import timezone
@@ -49,13 +51,14 @@ class UpComingCourses(generics.ListAPIView):
         return Course.objects.filter(date__gt=now).order_by("date")[:3]
 
 
-class FullCourseList(generics.ListAPIView):
+class FullCourseList(ConditionalGetMixin, generics.ListAPIView):
     """
     View to retrieve instances in a read-only format.
     Inherits from "ListAPIView", allowing any user, authenticated or not, to
     read the content.
     FullCourseList returns all future courses, but unlik the "CourseList"
     view, it returns a complete list, making it available for the front end.
+    Responses carry an ETag, so an unchanged list can be answered with a 304.
     """
 
     serializer_class = CourseSerializer
@@ -65,6 +68,18 @@ class FullCourseList(generics.ListAPIView):
         now = timezone.now()
         return Course.objects.filter(date__gt=now).order_by("date")
 
+    def get_validator_annotations(self):
+        """
+        "available_spaces" depends on the confirmed registrations, so each
+        course's are counted into the ETag.
+        """
+        return {
+            "confirmed": Count(
+                "courseregistration",
+                filter=Q(courseregistration__status="Confirmed"),
+            )
+        }
+
 
 class CourseCreate(generics.CreateAPIView):
     """
@@ -0,0 +1,97 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:49
+
+from django.db import migrations, models, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """
+    Deletes every follow that repeats an older follow between the same two
+    users, BATCH_SIZE rows per transaction, and recounts the stored
+    counters and follow times of the profiles involved, as deleting from
+    the historical model sends no signals.
+    """
+    Follower = apps.get_model('followers', 'Follower')
+    Profile = apps.get_model('profiles', 'Profile')
+    db_alias = schema_editor.connection.alias
+    follows = Follower.objects.using(db_alias)
+    duplicates = follows.filter(
+        Exists(
+            Follower.objects.filter(
+                owner=OuterRef('owner'),
+                followed=OuterRef('followed'),
+                pk__lt=OuterRef('pk'),
+            )
+        )
+    ).order_by('pk')
+
+    def latest_of(field):
+        return Subquery(
+            Follower.objects.filter(**{field: OuterRef('owner')})
+            .order_by()
+            .values(field)
+            .annotate(latest=Max('created_at'))
+            .values('latest')
+        )
+
+    def count_of(field):
+        counted = (
+            Follower.objects.filter(**{field: OuterRef('owner')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(counted), Value(0))
+
+    while True:
+        with transaction.atomic(using=db_alias):
+            batch = list(
+                duplicates.values_list('pk', 'owner_id', 'followed_id')[
+                    :BATCH_SIZE
+                ]
+            )
+            if not batch:
+                break
+            follows.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+            user_ids = {owner for _, owner, _ in batch} | {
+                followed for _, _, followed in batch
+            }
+            Profile.objects.using(db_alias).filter(
+                owner_id__in=user_ids
+            ).update(
+                followers_count=count_of('followed'),
+                following_count=count_of('owner'),
+                last_followed_at=latest_of('followed'),
+                last_following_at=latest_of('owner'),
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Each batch of the clean up commits on its own, rather than all of it
+    # in one long transaction.
+    atomic = False
+
+    dependencies = [
+        ('followers', '0003_remove_follower_unique_following'),
+        ('profiles', '0004_profile_follow_times'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='follower',
+            options={'ordering': ['-created_at']},
+        ),
+        # The duplicates have to go before the unique index can be built.
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follower',
+            constraint=models.UniqueConstraint(fields=('owner', 'followed'), name='unique_following'),
+        ),
+    ]
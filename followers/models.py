@@ -5,8 +5,12 @@ Much of the code in this file is copied from the drf-api walkthrough projects
 with Code Institute.
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User
+from foraging_api.counters import adjust_count
+from profiles.models import Profile
 
 
 class Follower(models.Model):
@@ -51,16 +55,97 @@ class Follower(models.Model):
         under the section of unique_together - Options.unique_together
         """
 
-    # Ensures ordering is most recent, first.
-    ordering = ["-created_at"]
+        # Ensures ordering is most recent, first.
+        ordering = ["-created_at"]
 
-    # Use of UniqueConstraint to enforce that a user can't follow the same
-    # user twice.
-    constraints = [
-        models.UniqueConstraint(
-            fields=["owner", "followed"], name="unique_following"
-        )
-    ]
+        # Use of UniqueConstraint to enforce that a user can't follow the
+        # same user twice. Its unique index on (owner, followed) also serves
+        # the lookups of whether one user follows another.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "followed"], name="unique_following"
+            )
+        ]
 
     def __str__(self):
         return f"{self.owner} {self.followed}"
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the follow in a transaction with the profile counters its
+        signal receivers update.
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+def increment_follow_counts(sender, instance, created, **kwargs):
+    """
+    Signal receiver that adds a new follow to the stored following_count of
+    the follower's profile and the followers_count of the followed user's.
+    """
+    if created:
+        adjust_count(
+            Profile, "following_count", 1, owner_id=instance.owner_id
+        )
+        adjust_count(
+            Profile, "followers_count", 1, owner_id=instance.followed_id
+        )
+
+
+def decrement_follow_counts(sender, instance, **kwargs):
+    """
+    Signal receiver that takes a deleted follow off both profiles' stored
+    counts.
+    """
+    adjust_count(Profile, "following_count", -1, owner_id=instance.owner_id)
+    adjust_count(
+        Profile, "followers_count", -1, owner_id=instance.followed_id
+    )
+
+
+def record_follow_times(sender, instance, created, **kwargs):
+    """
+    Signal receiver that stamps a new follow's time on the follower's
+    last_following_at and the followed user's last_followed_at.
+    """
+    if created:
+        Profile.objects.filter(owner_id=instance.owner_id).update(
+            last_following_at=instance.created_at
+        )
+        Profile.objects.filter(owner_id=instance.followed_id).update(
+            last_followed_at=instance.created_at
+        )
+
+
+def latest_follow(field):
+    """
+    Returns a subquery for the newest follow of the outer profile's owner,
+    with the owner as the follow's "field".
+    """
+    return Subquery(
+        Follower.objects.filter(**{field: OuterRef("owner")})
+        .order_by()
+        .values(field)
+        .annotate(latest=Max("created_at"))
+        .values("latest")
+    )
+
+
+def restore_follow_times(sender, instance, **kwargs):
+    """
+    Signal receiver that sets both profiles' follow times back to their
+    newest remaining follow, or None, when a follow is deleted.
+    """
+    Profile.objects.filter(owner_id=instance.owner_id).update(
+        last_following_at=latest_follow("owner")
+    )
+    Profile.objects.filter(owner_id=instance.followed_id).update(
+        last_followed_at=latest_follow("followed")
+    )
+
+
+post_save.connect(increment_follow_counts, sender=Follower)
+post_delete.connect(decrement_follow_counts, sender=Follower)
+post_save.connect(record_follow_times, sender=Follower)
+post_delete.connect(restore_follow_times, sender=Follower)
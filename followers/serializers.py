@@ -5,8 +5,9 @@ Much of the code in this file is copied from the drf-api walkthrough project
 with Code Institute.
 """
 
-from django.db import IntegrityError
+from django.db import transaction
 from rest_framework import serializers
+from foraging_api.db import create_or_ignore
 from .models import Follower
 
 
@@ -44,16 +45,18 @@ class FollowerSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        Tries to create a follower instance using valid data, raising error
-        messages if unsuccessful.
+        Creates the follower instance with a single
+        INSERT ... ON CONFLICT DO NOTHING, see create_or_ignore, raising an
+        error message if the user already follows the other user.
         """
-        try:
-            # Calls the create method from serializers.ModelSerializer in
-            # order to create a new follower instance
-            return super().create(validated_data)
-        except IntegrityError:
+        # The transaction takes in the profile counters the signal
+        # receivers update, as Follower.save does.
+        with transaction.atomic():
+            follower = create_or_ignore(Follower, **validated_data)
+        if follower is None:
             # Returns a validation error if the follow relationship already
             # exists.
             raise serializers.ValidationError(
                 {"detail": "possible duplicate"}
             )
+        return follower
@@ -1,5 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
 from django.db.utils import IntegrityError
 from .models import Follower
 
@@ -55,3 +58,38 @@ class FollowerModelTest(TestCase):
                 owner=self.user1,
                 followed=self.user2,
             )
+
+
+class FollowerCreateTest(APITestCase):
+    """
+    Tests following another user through the follower list.
+    """
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            username="test_user_1",
+            password="test_password_1",
+        )
+        self.user2 = User.objects.create_user(
+            username="test_user_2",
+            password="test_password_2",
+        )
+        self.client.force_authenticate(user=self.user1)
+
+    def test_duplicate_follow_rejected(self):
+        """
+        Checks that following the same user twice keeps one follow and one
+        count of it, and answers the repeat with an error message.
+        """
+        url = reverse("followers:follower_list")
+        response = self.client.post(url, {"followed": self.user2.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["owner"], "test_user_1")
+        self.assertEqual(response.data["followed_name"], "test_user_2")
+
+        response = self.client.post(url, {"followed": self.user2.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["detail"], "possible duplicate")
+        self.assertEqual(Follower.objects.count(), 1)
+        self.user2.profile.refresh_from_db()
+        self.assertEqual(self.user2.profile.followers_count, 1)
@@ -0,0 +1,125 @@
+"""
+Conditional GET support (ETag and Last-Modified) for the read views.
+
+Clients that poll a list or a post send back the ETag they were given in an
+"If-None-Match" header. If nothing they were shown has changed, they get an
+empty "304 Not Modified" instead of the whole page again, and the
+serializers never run.
+
+The ETag is a hash of the state of the rows the response shows: the page
+of a list view, or the one object of a detail view. Each row contributes
+its id, its "updated_at" and whatever each view adds for the data embedded
+in it, such as the like and comment counts and the requesting user's
+like_id. A like moving from one post to another changes the ETag even
+though no post was edited, which sums and counts over the whole list
+couldn't tell apart. List views also add the pagination envelope (count
+and links), as rows dropping off later pages change it without changing
+the page.
+"""
+
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    View mixin adding ETag and Last-Modified headers to GET responses, and
+    answering with 304 Not Modified when the client's ETag still matches.
+
+    Only the ETag is used to decide on a 304. It covers the embedded counts
+    and the requesting user, which Last-Modified can't, so Last-Modified is
+    sent for information only.
+    """
+
+    # Field whose newest value is sent as Last-Modified.
+    last_modified_field = "updated_at"
+    # Fields of each row that go into the ETag along with its pk. Anything
+    # embedded in the rows that can change without "updated_at" changing
+    # belongs here, or in get_validator_annotations.
+    validator_fields = ("updated_at",)
+
+    def get_validator_queryset(self):
+        """
+        Returns the rows the response is built from: the filtered list for
+        list views, in the order it's paged in, or the one object for detail
+        views.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            queryset = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        return queryset
+
+    def get_validator_annotations(self):
+        """
+        Returns annotations for data embedded in each row that isn't one of
+        its "validator_fields", such as the requesting user's like id.
+        """
+        return {}
+
+    def get_validator_rows(self):
+        """
+        Returns the state of the rows the response shows, as a list of
+        dicts of the pk, the "validator_fields" and the annotations. List
+        views read only the page asked for, through the view's paginator.
+        """
+        annotations = self.get_validator_annotations()
+        rows = (
+            self.get_validator_queryset()
+            .annotate(**annotations)
+            .values("pk", *self.validator_fields, *annotations)
+        )
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg not in self.kwargs:
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                return page
+        return list(rows)
+
+    def get_validators(self):
+        """
+        Hashes the rows into the ETag and returns it along with the
+        Last-Modified datetime, which is None when there are no rows.
+        """
+        rows = self.get_validator_rows()
+        # The response also depends on the query string (page, filters) and
+        # on who's asking (is_owner), so both go into the ETag.
+        fingerprint = [
+            self.request.get_full_path(),
+            str(self.request.user.pk),
+        ] + [repr(sorted(row.items())) for row in rows]
+        if hasattr(self.paginator, "page"):
+            envelope = self.get_paginated_response([]).data
+            fingerprint.append(repr(sorted(envelope.items())))
+        digest = hashlib.md5("|".join(fingerprint).encode()).hexdigest()
+
+        last_modified = max(
+            (
+                row[self.last_modified_field]
+                for row in rows
+                if row.get(self.last_modified_field)
+            ),
+            default=None,
+        )
+        return f'"{digest}"', last_modified
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(
+                    last_modified.timestamp()
+                )
+            # Always check back with the server before reusing a response,
+            # as the counts change without the rows being edited.
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
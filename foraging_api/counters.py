@@ -0,0 +1,274 @@
+"""
+Helpers for keeping the stored engagement counters (likes_count,
+comments_count and friends) in step with the rows they count.
+
+Counters are adjusted with an UPDATE using an F() expression, so the
+database does the arithmetic and two requests landing at the same time
+can't overwrite each other's change.
+
+A featured post can be liked hundreds of times in a few minutes, and each
+of those UPDATEs queues on the same row lock. With the "COUNTER_BUFFER"
+setting on, likes go through CounterBuffer instead: the increments are
+added up in a store, in the process ("local") or shared by the processes
+through the database ("database"), and a background thread writes them out
+every COUNTER_FLUSH_INTERVAL seconds, one UPDATE per model and counter for
+all the rows that changed. The counters read by the list endpoints are
+then at most an interval behind. Without the setting, counters are written
+straight away, as before. "rebuild_engagement_counts" puts the post and
+comment counters right if a process dies holding increments it hasn't
+flushed, which only the "local" store can lose.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+# Rows updated per flushed UPDATE statement.
+FLUSH_BATCH_SIZE = 500
+
+
+def adjust_count(model, field, delta, **lookup):
+    """
+    Adds "delta" to the integer column "field" on the rows of "model"
+    matching "lookup". Decrements never take a counter below zero.
+    """
+    queryset = model.objects.filter(**lookup)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+class LocalCounterStore:
+    """
+    Counter store held in the process's memory. Increments are keyed by
+    (model label, pk, field).
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, key, delta):
+        with self._lock:
+            self.counts[key] += delta
+
+    def get(self, key):
+        with self._lock:
+            return self.counts.get(key, 0)
+
+    def drain(self):
+        """
+        Takes every pending increment out of the store and returns them.
+        """
+        with self._lock:
+            counts, self.counts = self.counts, defaultdict(int)
+        return {key: delta for key, delta in counts.items() if delta}
+
+    def restore(self, counts):
+        """
+        Puts drained increments back after a flush failed.
+        """
+        for key, delta in counts.items():
+            self.add(key, delta)
+
+
+class DatabaseCounterStore:
+    """
+    Counter store shared by the processes through the database. Each
+    increment is inserted as a row of "model", likes.CounterIncrement by
+    default, so likes on the same post don't queue on the post's row lock,
+    and unlikes are kept as negative increments like any other.
+
+    A drain takes the pending rows whichever process added them, so none
+    are stranded when a process dies. It locks the rows it reads, skipping
+    any that another process is draining, and deletes them in the flush's
+    transaction, so a flush that fails puts them back by rolling back.
+    """
+
+    # Rows taken by one drain. Kept within SQLite's limit on the number of
+    # parameters of the DELETE.
+    batch_size = 900
+
+    def __init__(self, model="likes.CounterIncrement"):
+        self.model = model
+
+    @property
+    def increments(self):
+        return apps.get_model(self.model).objects
+
+    def add(self, key, delta):
+        label, pk, field = key
+        self.increments.create(
+            model_label=label, object_id=pk, field=field, delta=delta
+        )
+
+    def get(self, key):
+        label, pk, field = key
+        return (
+            self.increments.filter(
+                model_label=label, object_id=pk, field=field
+            ).aggregate(total=Sum("delta"))["total"]
+            or 0
+        )
+
+    def drain(self):
+        """
+        Takes up to "batch_size" pending increments out of the store and
+        returns them added up. Has to run in a transaction.
+        """
+        rows = list(
+            self.increments.select_for_update(skip_locked=True)
+            .order_by("pk")
+            .values_list("pk", "model_label", "object_id", "field", "delta")[
+                : self.batch_size
+            ]
+        )
+        self.increments.filter(pk__in=[row[0] for row in rows]).delete()
+        counts = defaultdict(int)
+        for _, label, pk, field, delta in rows:
+            counts[label, pk, field] += delta
+        return {key: delta for key, delta in counts.items() if delta}
+
+    def restore(self, counts):
+        # The drained rows come back with the flush's rollback.
+        pass
+
+
+def flush_counts(counts):
+    """
+    Writes increments from a counter store to the database, one UPDATE per
+    model and counter for every FLUSH_BATCH_SIZE rows, in a transaction.
+    Like adjust_count, counters never go below zero.
+    """
+    grouped = defaultdict(dict)
+    for (label, pk, field), delta in counts.items():
+        grouped[label, field][pk] = delta
+
+    updated = 0
+    with transaction.atomic():
+        for (label, field), deltas in grouped.items():
+            model = apps.get_model(label)
+            pks = sorted(deltas)
+            for start in range(0, len(pks), FLUSH_BATCH_SIZE):
+                batch = pks[start : start + FLUSH_BATCH_SIZE]
+                new_value = Case(
+                    *[
+                        When(
+                            pk=pk,
+                            then=Greatest(F(field) + deltas[pk], Value(0)),
+                        )
+                        for pk in batch
+                    ],
+                    default=F(field),
+                )
+                updated += model.objects.filter(pk__in=batch).update(
+                    **{field: new_value}
+                )
+    return updated
+
+
+class CounterBuffer:
+    """
+    Write-behind buffer for the stored counters. add() records an increment
+    in "store", and a daemon thread, started with the first increment,
+    flushes the store every "interval" seconds, as does the process exiting.
+    With no store, add() updates the row straight away with adjust_count.
+    """
+
+    def __init__(self, store=None, interval=2.0, start_worker=True):
+        self.store = store
+        self.interval = interval
+        self.start_worker = start_worker
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        stores = {
+            "local": LocalCounterStore,
+            "database": DatabaseCounterStore,
+        }
+        store = (
+            stores[settings.COUNTER_BUFFER]()
+            if settings.COUNTER_BUFFER
+            else None
+        )
+        return cls(store, settings.COUNTER_FLUSH_INTERVAL)
+
+    def add(self, model, pk, field, delta):
+        """
+        Adds "delta" to the counter "field" of the "model" row with "pk".
+        Buffered increments are only recorded once the surrounding
+        transaction commits, so one that's rolled back leaves nothing
+        behind in the store. Unbuffered ones are written inside it.
+        """
+        if self.store is None:
+            adjust_count(model, field, delta, pk=pk)
+            return
+        key = (model._meta.label, pk, field)
+        transaction.on_commit(lambda: self._record(key, delta))
+
+    def _record(self, key, delta):
+        self.store.add(key, delta)
+        if self.start_worker:
+            self._ensure_worker()
+
+    def pending(self, model, pk, field):
+        """
+        Returns the increments to a counter that haven't been flushed yet,
+        to add to the stored value for an up to date count.
+        """
+        if self.store is None:
+            return 0
+        return self.store.get((model._meta.label, pk, field))
+
+    def flush(self):
+        """
+        Writes the pending increments to the database and returns the
+        number of rows updated. If that fails they go back in the store.
+        """
+        if self.store is None:
+            return 0
+        counts = {}
+        try:
+            with transaction.atomic():
+                counts = self.store.drain()
+                return flush_counts(counts) if counts else 0
+        except Exception:
+            self.store.restore(counts)
+            raise
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                # Whatever's left is written out when the process exits.
+                atexit.register(self.flush)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="counter-buffer", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing the counter buffer failed")
+            finally:
+                # The thread has its own database connection, which has to
+                # be tidied up the way a request's would be.
+                close_old_connections()
+
+
+counter_buffer = CounterBuffer.from_settings()
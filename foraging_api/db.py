@@ -0,0 +1,151 @@
+"""
+Database helpers shared by the apps.
+
+Production runs on PostgreSQL, while the "DEV" settings use SQLite. Some of
+the performance work (full-text search, GIN indexes) only exists on
+PostgreSQL, so these helpers let the code and migrations check which
+database they're talking to and fall back gracefully on SQLite.
+"""
+
+from django.db import connection, connections, migrations, router
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_save
+
+
+def is_postgresql(db_connection=None):
+    """
+    Returns True if the given connection, or the default one, is PostgreSQL.
+    """
+    return (db_connection or connection).vendor == "postgresql"
+
+
+def subquery_count(queryset, field, outer_field="pk"):
+    """
+    Returns an expression counting the rows of "queryset" whose "field"
+    matches the outer row's "outer_field", as a correlated subquery.
+
+    Annotating several Count()s over one-to-many relations joins them all
+    at once, so each row is multiplied out into every combination of its
+    related rows before DISTINCT collapses them again. Each subquery count
+    is worked out on its own, from the index on "field".
+    """
+    counted = (
+        queryset.filter(**{field: OuterRef(outer_field)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def create_or_ignore(model, **values):
+    """
+    Creates a "model" row from "values" with a single
+    INSERT ... ON CONFLICT DO NOTHING RETURNING statement, and returns the
+    new instance, or None if a unique constraint already holds a matching
+    row. Unlike create(), a duplicate never raises IntegrityError, so it
+    doesn't abort the surrounding transaction.
+
+    Field defaults and auto_now_add timestamps are filled in the way save()
+    fills them, and pre_save and post_save are sent for a created row, so
+    receivers such as the engagement counters still run. Both PostgreSQL
+    and SQLite (3.35 or newer) support the statement.
+    """
+    instance = model(**values)
+    using = router.db_for_write(model, instance=instance)
+    db_connection = connections[using]
+    opts = model._meta
+    pre_save.send(
+        sender=model,
+        instance=instance,
+        raw=False,
+        using=using,
+        update_fields=None,
+    )
+
+    fields = [
+        field
+        for field in opts.concrete_fields
+        if not (field.primary_key and field.get_default() is None)
+    ]
+    quote = db_connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    params = [
+        field.get_db_prep_save(
+            field.pre_save(instance, add=True), db_connection
+        )
+        for field in fields
+    ]
+    with db_connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+            f"VALUES ({placeholders}) ON CONFLICT DO NOTHING "
+            f"RETURNING {quote(opts.pk.column)}",
+            params,
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    instance.pk = row[0]
+    instance._state.adding = False
+    instance._state.db = using
+    post_save.send(
+        sender=model,
+        instance=instance,
+        created=True,
+        update_fields=None,
+        raw=False,
+        using=using,
+    )
+    return instance
+
+
+def fields_to_update(instance, stored_fields, update_fields=None):
+    """
+    Returns the update_fields for saving an existing "instance", leaving
+    out "stored_fields" and any deferred fields.
+
+    Stored counters and the like are only ever changed with UPDATE ... SET
+    column = column + 1 style queries. A full-row save would write back the
+    values loaded with the instance, undoing anything counted since, so
+    saves of existing rows leave them out. Passing "update_fields" keeps
+    the caller's own choice.
+    """
+    if update_fields is not None:
+        return update_fields
+    deferred = instance.get_deferred_fields()
+    return [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key
+        and field.name not in stored_fields
+        and field.attname not in deferred
+    ]
+
+
+class RunSQLOnPostgreSQL(migrations.RunSQL):
+    """
+    RunSQL operation that only runs against PostgreSQL and does nothing on
+    other databases, so PostgreSQL specific indexes don't break migrating the
+    SQLite development database.
+    """
+
+    def database_forwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        if is_postgresql(schema_editor.connection):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        if is_postgresql(schema_editor.connection):
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
@@ -0,0 +1,326 @@
+"""
+Image upload helpers shared by the apps.
+
+Uploaded images used to be checked through DRF's ImageField, which makes
+Pillow verify the whole file inside the request before the serializer's own
+size and dimension checks run. ImageUploadValidator checks the upload's
+size first, from the request metadata, and then reads only as much of the
+file as Pillow needs to identify the format and dimensions, usually a few
+KB. Pixel data is never decoded.
+
+Smaller copies of avatars and plant images, the derivatives, are generated
+after the image is uploaded, so the clients can download a size that fits
+where the image is shown instead of the original. Decoding and resizing
+the image, and storing the copies, is left to the background upload
+worker, see foraging_api/uploads.py, so it doesn't hold up the request.
+
+Building a file's URL isn't free either: Cloudinary's storage assembles
+each URL in Python, and avatars are resolved for every comment and post on
+a page. StorageURLCache keeps the URLs of recently used names, and the
+serializers read them through StorageURLField and ImageSrcsetField.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from io import BytesIO
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Formats accepted for uploads.
+ALLOWED_IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+
+# Sizes of the derivatives, in pixels. Avatars are cropped square, plant
+# images are scaled to the width, keeping their proportions.
+AVATAR_SIZES = (64, 128)
+PLANT_CARD_SIZES = (400, 800)
+
+# Format, dimensions, how many bytes were read to find them and how long
+# the validation took, in seconds.
+ImageHeader = namedtuple(
+    "ImageHeader", ["format", "width", "height", "bytes_read", "elapsed"]
+)
+
+
+class CountingReader:
+    """
+    Wraps a file and counts the bytes read through it, so the validator can
+    report how much of an upload it needed to look at.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+
+def read_image_header(file):
+    """
+    Returns the ImageHeader of an image file, reading only its header.
+    Raises ValueError if the file isn't an image in one of the allowed
+    formats. The file is left at position 0 for whoever saves it.
+    """
+    started = time.perf_counter()
+    reader = CountingReader(file)
+    file.seek(0)
+    try:
+        # Image.open only parses the header, the pixel data is left unread
+        # unless the image is loaded, which never happens here.
+        with Image.open(reader, formats=ALLOWED_IMAGE_FORMATS) as image:
+            image_format = image.format
+            width, height = image.size
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise ValueError("Not a supported image file.")
+    finally:
+        file.seek(0)
+    return ImageHeader(
+        image_format,
+        width,
+        height,
+        reader.bytes_read,
+        time.perf_counter() - started,
+    )
+
+
+class ImageUploadValidator:
+    """
+    Serializer field validator for image uploads.
+
+    Rejects uploads larger than "max_size" bytes before any of the file is
+    read, then uses the header to reject anything that isn't an image, or
+    is wider or taller than allowed. "name" is used in the error messages.
+    The ImageHeader is kept on the file as "image_header" and the time taken
+    is logged.
+    """
+
+    def __init__(self, name, max_width, max_height, max_size=2 * 1024 * 1024):
+        self.name = name
+        self.max_width = max_width
+        self.max_height = max_height
+        self.max_size = max_size
+
+    def __call__(self, value):
+        if value.size > self.max_size:
+            raise serializers.ValidationError(
+                f"{self.name} size cannot exceed "
+                f"{self.max_size // (1024 * 1024)}MB."
+            )
+
+        try:
+            header = read_image_header(value)
+        except ValueError:
+            raise serializers.ValidationError(
+                f"{self.name} must be a JPEG, PNG, GIF or WEBP image."
+            )
+        value.image_header = header
+        logger.debug(
+            "Validated %s upload %r (%s %dx%d) reading %d of %d bytes "
+            "in %.2fms",
+            self.name,
+            value.name,
+            header.format,
+            header.width,
+            header.height,
+            header.bytes_read,
+            value.size,
+            header.elapsed * 1000,
+        )
+
+        if header.height > self.max_height:
+            raise serializers.ValidationError(
+                f"{self.name} height cannot exceed {self.max_height} pixels."
+            )
+
+        if header.width > self.max_width:
+            raise serializers.ValidationError(
+                f"{self.name} width cannot exceed {self.max_width} pixels."
+            )
+
+
+class StorageURLCache:
+    """
+    Bounded, thread-safe LRU cache of storage URLs, keyed by the stored
+    file's name. A stored name never changes what it points to, a new
+    upload gets a new name, so entries only go stale when a file is
+    replaced under the same name, or moves storage, which is when
+    invalidate() is called. The least recently used entries are dropped
+    once there are more than "maxsize".
+    """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def url(self, storage, name):
+        """
+        Returns the URL of "name" in "storage", building it only if it
+        isn't cached.
+        """
+        with self._lock:
+            if name in self._urls:
+                self._urls.move_to_end(name)
+                return self._urls[name]
+
+        # Built outside the lock so other threads aren't held up. Two
+        # threads missing on the same name both build the same URL.
+        url = storage.url(name)
+        with self._lock:
+            self._urls[name] = url
+            self._urls.move_to_end(name)
+            if len(self._urls) > self.maxsize:
+                self._urls.popitem(last=False)
+        return url
+
+    def invalidate(self, *names):
+        with self._lock:
+            for name in names:
+                self._urls.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._urls.clear()
+
+
+url_cache = StorageURLCache()
+
+
+def field_file_url(field_file):
+    """
+    Returns the URL of a stored file through the URL cache.
+    """
+    return url_cache.url(field_file.storage, field_file.name)
+
+
+def invalidate_image_urls(instance, field_name):
+    """
+    Drops the cached URLs of the file, and its derivatives, that an image
+    field holds in the database, before a new upload replaces them, and
+    returns the names of those derivatives. Nothing is looked up for
+    instances that aren't saved yet.
+    """
+    if instance.pk is None:
+        return []
+    derivatives_field = f"{field_name}_derivatives"
+    columns = [field_name]
+    if hasattr(type(instance), derivatives_field):
+        columns.append(derivatives_field)
+    stored = (
+        type(instance)
+        ._default_manager.filter(pk=instance.pk)
+        .values(*columns)
+        .first()
+    )
+    if not stored:
+        return []
+    derivatives = list((stored.get(derivatives_field) or {}).values())
+    url_cache.invalidate(stored[field_name], *derivatives)
+    return derivatives
+
+
+def generate_derivatives(field_file, sizes, square=False):
+    """
+    Saves a resized JPEG copy of a newly uploaded image for each size, next
+    to the original in its storage, and returns their names keyed by the
+    size as a string, ready to be kept in a JSONField.
+
+    With "square" the copies are cropped to size x size, otherwise they're
+    scaled to the width. Images are never enlarged, so a size larger than
+    the original gets a copy at the original size.
+    """
+    field_file.seek(0)
+    with Image.open(field_file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            # JPEG has no transparency, so it's flattened onto white.
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba)
+
+        stem = os.path.splitext(os.path.basename(field_file.name))[0]
+        upload_to = field_file.field.upload_to
+        derivatives = {}
+        for size in sizes:
+            if square:
+                side = min(size, *image.size)
+                resized = ImageOps.fit(image, (side, side), Image.LANCZOS)
+            else:
+                width = min(size, image.width)
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, format="JPEG", quality=85, optimize=True)
+            derivatives[str(size)] = field_file.storage.save(
+                f"{upload_to}derivatives/{stem}_{size}.jpg",
+                ContentFile(buffer.getvalue()),
+            )
+    field_file.seek(0)
+    return derivatives
+
+
+def image_srcset(storage, name, derivatives, sizes):
+    """
+    Returns the srcset map of a stored image from its name and derivatives,
+    as ImageSrcsetField gives it, for code that works from raw column
+    values rather than model instances.
+    """
+    if not name:
+        return None
+    derivatives = derivatives or {}
+    return {
+        str(size): url_cache.url(storage, derivatives.get(str(size)) or name)
+        for size in sizes
+    }
+
+
+class ImageSrcsetField(serializers.Field):
+    """
+    Read-only field returning the URL of each derivative of an image, keyed
+    by its size, like a srcset. "image_field" is the name of the image field
+    on the object given by "source", whose derivatives are read from
+    "<image_field>_derivatives". Sizes without a derivative, such as for the
+    default images, get the original image's URL. An empty image gives None.
+    """
+
+    def __init__(self, image_field, sizes, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+        self.image_field = image_field
+        self.sizes = sizes
+
+    def to_representation(self, value):
+        field_file = getattr(value, self.image_field)
+        return image_srcset(
+            field_file.storage,
+            field_file.name,
+            getattr(value, f"{self.image_field}_derivatives"),
+            self.sizes,
+        )
+
+
+class StorageURLField(serializers.ReadOnlyField):
+    """
+    Read-only field returning the URL of the file given by "source", such
+    as "owner.profile.image", built through the URL cache. An empty file
+    gives None.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return field_file_url(value)
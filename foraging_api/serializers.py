@@ -5,18 +5,48 @@
 # while omitting "email", thereby making email writable.
 
 from dj_rest_auth.serializers import UserDetailsSerializer
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
+from foraging_api.images import (
+    AVATAR_SIZES,
+    ImageSrcsetField,
+    StorageURLField,
+)
 
 
 class CurrentUserSerializer(UserDetailsSerializer):
     profile_id = serializers.ReadOnlyField(source="profile.id")
-    profile_image = serializers.ReadOnlyField(source="profile.image.url")
+    profile_image = StorageURLField(source="profile.image")
+    profile_image_srcset = ImageSrcsetField(
+        "image", AVATAR_SIZES, source="profile"
+    )
 
     class Meta(UserDetailsSerializer.Meta):
         fields = UserDetailsSerializer.Meta.fields + (
             "profile_id",
             "profile_image",
+            "profile_image_srcset",
         )
 
         # 'email' becomes writable due to its ommittance when redefining the read_only_fields.
-        read_only_fields = ("profile_id", "profile_image")
+        read_only_fields = (
+            "profile_id",
+            "profile_image",
+            "profile_image_srcset",
+        )
+
+
+class BatchedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that lets the child serializer look up per-user state
+    (like ids, following ids) for the whole page in one query before the
+    rows are serialized. The child opts in by defining a "resolve_page"
+    method, which is given the list of objects on the page.
+    """
+
+    def to_representation(self, data):
+        objects = list(data.all() if isinstance(data, BaseManager) else data)
+        resolve_page = getattr(self.child, "resolve_page", None)
+        if resolve_page is not None:
+            resolve_page(objects)
+        return super().to_representation(objects)
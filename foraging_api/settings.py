@@ -25,6 +25,21 @@ CLOUDINARY_STORAGE = {"CLOUDINARY_URL": os.environ.get("CLOUDINARY_URL")}
 MEDIA_URL = "/media/"
 DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.MediaCloudinaryStorage"
 
+# Deferred uploads: new images are staged in the database and pushed to
+# Cloudinary by a background thread, instead of inside the request. See
+# foraging_api/uploads.py.
+DEFERRED_UPLOAD_BACKEND = DEFAULT_FILE_STORAGE
+DEFERRED_UPLOAD_URL = "/media/pending/"
+if "DEFERRED_UPLOADS" in os.environ:
+    DEFAULT_FILE_STORAGE = "foraging_api.uploads.DeferredUploadStorage"
+
+
+# Buffers like counter increments and writes them in batches, "local" to
+# each process or shared through the "database", instead of updating the
+# row on every like. See foraging_api/counters.py.
+COUNTER_BUFFER = os.environ.get("COUNTER_BUFFER")
+COUNTER_FLUSH_INTERVAL = float(os.environ.get("COUNTER_FLUSH_INTERVAL", 2))
+
 
 # Base directory of the project.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -0,0 +1,467 @@
+"""
+Deferred image uploads.
+
+With Cloudinary as the default file storage, saving a post or profile with
+a new image uploads the file inside the request, and the gunicorn worker
+waits on Cloudinary for the whole round-trip. DeferredUploadStorage stages
+new files in the database instead, under a "pending/" name, so the request
+can return straight away. Once the transaction commits, the file is queued,
+and a background thread pushes it to the real storage backend and swaps
+the final name into the row.
+
+The staged files are PendingUpload rows, see DatabaseStorage. Unlike the
+dyno's local disk, which is ephemeral and separate for each Heroku dyno,
+the database is shared and durable, so whichever dyno or one-off process
+runs "push_pending_uploads" can push them, and a restart loses nothing.
+Until a file is pushed, its URL points at DEFERRED_UPLOAD_URL, which serves
+it from the database, and the "pending/" prefix on the name shows the
+upload hasn't been pushed yet.
+
+The same worker generates the derivatives of newly uploaded images, see
+register_derivatives, whether or not uploads are deferred, and deletes the
+derivatives of the images they replace.
+
+Deferred uploads are switched on by setting DEFAULT_FILE_STORAGE to
+"foraging_api.uploads.DeferredUploadStorage", which settings.py does when
+the "DEFERRED_UPLOADS" environment variable is set.
+"""
+
+import logging
+import queue
+import threading
+from collections import namedtuple
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, get_storage_class
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models.functions import Length
+from django.db.models.signals import post_save, pre_save
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from foraging_api.images import (
+    generate_derivatives,
+    invalidate_image_urls,
+    url_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the names of files that are still staged, not yet pushed.
+PENDING_PREFIX = "pending/"
+
+# One file to push: the model's label, the row's pk, the field's name and
+# the pending name the field held when the job was queued.
+UploadJob = namedtuple("UploadJob", ["model", "pk", "field", "name"])
+
+# An image to generate the derivatives of: the model's label, the row's pk,
+# the field's name, the name the field held when the job was queued, which
+# is empty if the image was cleared, and the names of the derivatives of
+# the image it replaced, which are deleted.
+DerivativesJob = namedtuple(
+    "DerivativesJob", ["model", "pk", "field", "name", "replaced"]
+)
+
+# Registered models, mapped to the names of their deferred file fields.
+DEFERRED_UPLOAD_FIELDS = {}
+
+# Registered models, mapped to their image fields' names, each with the
+# sizes of its derivatives and whether they're cropped square.
+DERIVATIVE_SIZES = {}
+
+
+def is_pending(name):
+    """
+    Returns True if a stored file name is still waiting to be pushed.
+    """
+    return bool(name) and name.startswith(PENDING_PREFIX)
+
+
+class DatabaseStorage(Storage):
+    """
+    Storage keeping whole files in the database, as rows of "model",
+    plants_blog.PendingUpload by default, and serving them from "base_url",
+    DEFERRED_UPLOAD_URL by default. It's the staging area of
+    DeferredUploadStorage, for files that are only kept until they're
+    pushed, and the uploads it takes are limited in size by the image
+    validators.
+    """
+
+    def __init__(self, model="plants_blog.PendingUpload", base_url=None):
+        self.model = model
+        if base_url is None:
+            base_url = settings.DEFERRED_UPLOAD_URL
+        self.base_url = base_url
+
+    @property
+    def files(self):
+        return apps.get_model(self.model).objects
+
+    def _save(self, name, content):
+        data = content.read()
+        while True:
+            # The name picked by get_available_name can be taken by another
+            # upload before it's inserted, in which case the next free one
+            # is tried, as FileSystemStorage does.
+            try:
+                with transaction.atomic():
+                    self.files.create(name=name, content=data)
+                return name
+            except IntegrityError:
+                name = self.get_available_name(name)
+
+    def _open(self, name, mode="rb"):
+        content = self.files.filter(name=name).values_list(
+            "content", flat=True
+        )
+        if not content:
+            raise FileNotFoundError(name)
+        return ContentFile(bytes(content[0]), name=name)
+
+    def delete(self, name):
+        self.files.filter(name=name).delete()
+
+    def exists(self, name):
+        return self.files.filter(name=name).exists()
+
+    def size(self, name):
+        size = (
+            self.files.filter(name=name)
+            .values_list(Length("content"), flat=True)
+            .first()
+        )
+        if size is None:
+            raise FileNotFoundError(name)
+        return size
+
+    def url(self, name):
+        return self.base_url + filepath_to_uri(name)
+
+
+class DeferredUploadStorage(Storage):
+    """
+    Storage that stages new files and hands them to "backend" later.
+
+    Names starting with PENDING_PREFIX live in the "local" storage, every
+    other name is passed through to the backend, so existing files keep
+    working. The backend defaults to DEFERRED_UPLOAD_BACKEND and the local
+    storage to a DatabaseStorage, and both can be passed in to test against
+    stand-ins.
+    """
+
+    def __init__(self, backend=None, local=None):
+        if backend is None:
+            backend = get_storage_class(settings.DEFERRED_UPLOAD_BACKEND)()
+        if local is None:
+            local = DatabaseStorage()
+        self.backend = backend
+        self.local = local
+
+    def _storage_for(self, name):
+        """
+        Returns the storage holding "name", and the name within it.
+        """
+        if is_pending(name):
+            return self.local, name[len(PENDING_PREFIX) :]
+        return self.backend, name
+
+    def get_available_name(self, name, max_length=None):
+        # The local storage picks the free name, so there's no need to ask
+        # the backend, which is a network call. The prefix counts towards
+        # the field's max_length, so the local name is kept short enough
+        # to leave room for it.
+        if max_length is not None:
+            max_length -= len(PENDING_PREFIX)
+        return PENDING_PREFIX + self.local.get_available_name(
+            name, max_length=max_length
+        )
+
+    def _save(self, name, content):
+        return PENDING_PREFIX + self.local.save(
+            name[len(PENDING_PREFIX) :], content
+        )
+
+    def _open(self, name, mode="rb"):
+        storage, name = self._storage_for(name)
+        return storage.open(name, mode)
+
+    def delete(self, name):
+        storage, name = self._storage_for(name)
+        storage.delete(name)
+
+    def exists(self, name):
+        storage, name = self._storage_for(name)
+        return storage.exists(name)
+
+    def size(self, name):
+        storage, name = self._storage_for(name)
+        return storage.size(name)
+
+    def url(self, name):
+        storage, name = self._storage_for(name)
+        return storage.url(name)
+
+    def push(self, name):
+        """
+        Uploads a pending file to the backend and removes the staged copy.
+        Returns the name the backend stored it under.
+        """
+        local_name = name[len(PENDING_PREFIX) :]
+        with self.local.open(local_name) as content:
+            final_name = self.backend.save(local_name, content)
+        self.local.delete(local_name)
+        return final_name
+
+
+def touched(model):
+    """
+    Returns the "auto_now" fields of "model" set to the current time, for
+    an update() to bump them the way save() would.
+    """
+    now = timezone.now()
+    return {
+        field.name: now
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False)
+    }
+
+
+def push_upload(job):
+    """
+    Pushes the file of one UploadJob and swaps its final name into the row.
+
+    If the model has a "<field>_derivatives" JSONField, see
+    register_derivatives, the pending derivatives are pushed along with the
+    file and their names swapped in the same update.
+
+    The row is only updated if it still holds the pending name. If it was
+    deleted, or given another file in the meantime, the pushed files are
+    removed from the backend again rather than left orphaned.
+    """
+    model = apps.get_model(job.model)
+    storage = model._meta.get_field(job.field).storage
+    if not isinstance(storage, DeferredUploadStorage):
+        return
+    if not storage.local.exists(job.name[len(PENDING_PREFIX) :]):
+        # Already pushed by another worker or an earlier run.
+        return
+
+    row = model.objects.filter(pk=job.pk, **{job.field: job.name})
+    changes = {job.field: storage.push(job.name)}
+    pushed = [changes[job.field]]
+    pending = [job.name]
+
+    derivatives_field = f"{job.field}_derivatives"
+    if hasattr(model, derivatives_field):
+        derivatives = row.values_list(derivatives_field, flat=True).first()
+        if derivatives:
+            for size, name in derivatives.items():
+                if is_pending(name):
+                    pending.append(name)
+                    derivatives[size] = storage.push(name)
+                    pushed.append(derivatives[size])
+            changes[derivatives_field] = derivatives
+
+    # update() skips save() and the signals, so the row isn't revalidated
+    # and the upload isn't queued again. It doesn't touch the row's
+    # timestamp either, which the ETags are built from, so that's set here.
+    if not row.update(**changes, **touched(model)):
+        for name in pushed:
+            storage.backend.delete(name)
+        return
+    # The pending names' local URLs are no use any more.
+    url_cache.invalidate(*pending)
+    logger.info(
+        "Pushed %s.%s upload for %s: %s",
+        job.model,
+        job.field,
+        job.pk,
+        changes[job.field],
+    )
+
+
+def make_derivatives(job):
+    """
+    Generates the derivatives of the image of one DerivativesJob and saves
+    their names into the row, then deletes the derivatives of the image it
+    replaced.
+
+    Nothing is generated if the row was deleted, or given another image,
+    in the meantime, as the new image has a job of its own.
+    """
+    model = apps.get_model(job.model)
+    field = model._meta.get_field(job.field)
+    row = model.objects.filter(pk=job.pk, **{job.field: job.name})
+    if job.name and row.exists():
+        sizes, square = DERIVATIVE_SIZES[model][job.field]
+        field_file = field.attr_class(None, field, job.name)
+        try:
+            derivatives = generate_derivatives(field_file, sizes, square)
+        finally:
+            field_file.close()
+        # As in push_upload, update() doesn't queue the image again.
+        if not row.update(
+            **{f"{job.field}_derivatives": derivatives}, **touched(model)
+        ):
+            for name in derivatives.values():
+                field.storage.delete(name)
+    for name in job.replaced:
+        field.storage.delete(name)
+
+
+class UploadQueue:
+    """
+    Queue of UploadJobs and DerivativesJobs, worked through by a daemon thread that's started
+    with the first job. With "start_worker" off, nothing runs until
+    drain() is called, which is what the tests and the management command
+    use.
+    """
+
+    def __init__(self, start_worker=True):
+        self.jobs = queue.Queue()
+        self.start_worker = start_worker
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, job):
+        self.jobs.put(job)
+        if self.start_worker:
+            self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="deferred-uploads", daemon=True
+                )
+                self._worker.start()
+
+    def _process(self, job):
+        try:
+            if isinstance(job, DerivativesJob):
+                make_derivatives(job)
+            else:
+                push_upload(job)
+        except Exception:
+            # A file stays pending and is picked up again by
+            # push_pending_uploads.
+            logger.exception("Deferred upload failed: %r", job)
+        finally:
+            # The thread has its own database connection, which has to be
+            # tidied up the way a request's would be.
+            close_old_connections()
+            self.jobs.task_done()
+
+    def _run(self):
+        while True:
+            self._process(self.jobs.get())
+
+    def drain(self):
+        """
+        Processes every queued job in the calling thread.
+        """
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            self._process(job)
+
+
+upload_queue = UploadQueue()
+
+
+def clear_replaced_derivatives(sender, instance, **kwargs):
+    """
+    Signal receiver that clears the derivatives of registered image fields
+    given a new image, or cleared, before the instance is saved. The
+    replaced derivatives' names are kept on the instance for
+    queue_pending_uploads, and their cached URLs are dropped. An image
+    that hasn't changed is left alone.
+    """
+    for field_name in DERIVATIVE_SIZES.get(sender, ()):
+        field_file = getattr(instance, field_name)
+        if field_file and field_file._committed:
+            continue
+        replaced = invalidate_image_urls(instance, field_name)
+        setattr(instance, f"{field_name}_derivatives", {})
+        instance.__dict__.setdefault("_replaced_derivatives", {})[
+            field_name
+        ] = replaced
+
+
+def queue_pending_uploads(sender, instance, **kwargs):
+    """
+    Signal receiver queueing the derivatives to generate and the pending
+    files of a saved instance, once the transaction they were saved in has
+    committed. The derivatives are queued first, so a pending image's are
+    made from the staged copy and pushed along with it.
+    """
+    label = sender._meta.label
+    jobs = [
+        DerivativesJob(
+            label,
+            instance.pk,
+            field_name,
+            getattr(instance, field_name).name or "",
+            tuple(replaced),
+        )
+        for field_name, replaced in instance.__dict__.pop(
+            "_replaced_derivatives", {}
+        ).items()
+    ]
+    for field_name in DEFERRED_UPLOAD_FIELDS.get(sender, ()):
+        name = getattr(instance, field_name).name
+        if is_pending(name):
+            jobs.append(UploadJob(label, instance.pk, field_name, name))
+    for job in jobs:
+        transaction.on_commit(lambda job=job: upload_queue.enqueue(job))
+
+
+def connect_upload_receivers(model):
+    """
+    Connects the receivers of registered models, once each.
+    """
+    pre_save.connect(
+        clear_replaced_derivatives,
+        sender=model,
+        dispatch_uid=f"derivatives_{model._meta.label}",
+    )
+    post_save.connect(
+        queue_pending_uploads,
+        sender=model,
+        dispatch_uid=f"deferred_uploads_{model._meta.label}",
+    )
+
+
+def register_deferred_uploads(model, *field_names):
+    """
+    Registers file fields of a model whose new files are pushed to the
+    storage backend in the background.
+    """
+    DEFERRED_UPLOAD_FIELDS.setdefault(model, []).extend(field_names)
+    connect_upload_receivers(model)
+
+
+def register_derivatives(model, field_name, sizes, square=False):
+    """
+    Registers an image field of a model whose new images get derivatives of
+    the given sizes, kept in the model's "<field_name>_derivatives"
+    JSONField, generated in the background.
+    """
+    DERIVATIVE_SIZES.setdefault(model, {})[field_name] = (sizes, square)
+    connect_upload_receivers(model)
+
+
+def find_pending_uploads():
+    """
+    Returns an UploadJob for every registered field still holding a pending
+    name.
+    """
+    for model, field_names in DEFERRED_UPLOAD_FIELDS.items():
+        for field_name in field_names:
+            rows = model.objects.filter(
+                **{f"{field_name}__startswith": PENDING_PREFIX}
+            ).values_list("pk", field_name)
+            for pk, name in rows.iterator():
+                yield UploadJob(model._meta.label, pk, field_name, name)
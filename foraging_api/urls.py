@@ -14,9 +14,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
-from .views import root_route, logout_route
+from django.urls import path, include, re_path
+from .views import (
+    root_route,
+    logout_route,
+    engagement_state,
+    pending_upload,
+)
 
 """
 Main project's urls.py with patterns for the apps within it, using the
@@ -29,6 +35,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api-auth/", include("rest_framework.urls")),
     path("dj-rest-auth/logout/", logout_route),
+    path("engagement/", engagement_state, name="engagement_state"),
     path("dj-rest-auth/", include("dj_rest_auth.urls")),
     path(
         "dj-rest-auth/registration/",
@@ -51,3 +58,13 @@ urlpatterns = [
         ),
     ),
 ]
+
+# Images that are still waiting to be pushed to Cloudinary are served from
+# the database, see foraging_api/uploads.py.
+if settings.DEFAULT_FILE_STORAGE.endswith(".DeferredUploadStorage"):
+    urlpatterns.append(
+        re_path(
+            r"^%s(?P<path>.*)$" % settings.DEFERRED_UPLOAD_URL.lstrip("/"),
+            pending_upload,
+        )
+    )
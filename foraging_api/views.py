@@ -1,5 +1,15 @@
+import mimetypes
+from django.db.models import Q
+from django.http import Http404, HttpResponse
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from comments.models import Comment
+from followers.models import Follower
+from likes.models import Like
+from plants_blog.models import PlantInFocusPost
+from profiles.models import Profile
+from .uploads import DatabaseStorage
 from .settings import (
     JWT_AUTH_COOKIE,
     JWT_AUTH_REFRESH_COOKIE,
@@ -36,3 +46,147 @@ def logout_route(request):
         secure=JWT_AUTH_SECURE,
     )
     return response
+
+
+# Most ids of each kind one engagement request can ask about.
+MAX_ENGAGEMENT_IDS = 100
+
+
+def engagement_ids(request, name):
+    """
+    Returns the ids in the comma separated "name" query parameter.
+    """
+    value = request.query_params.get(name, "")
+    try:
+        ids = {int(pk) for pk in value.split(",") if pk.strip()}
+    except ValueError:
+        raise ValidationError(
+            {name: "Must be a comma separated list of ids."}
+        )
+    if len(ids) > MAX_ENGAGEMENT_IDS:
+        raise ValidationError(
+            {name: f"No more than {MAX_ENGAGEMENT_IDS} ids can be asked for."}
+        )
+    return ids
+
+
+def post_states(ids):
+    """
+    Returns the counts of the posts with "ids", keyed by id, from one query.
+    """
+    if not ids:
+        return {}
+    rows = (
+        PlantInFocusPost.objects.filter(pk__in=ids)
+        .order_by()
+        .values_list("pk", "likes_count", "comments_count")
+    )
+    return {
+        pk: {
+            "like_id": None,
+            "likes_count": likes_count,
+            "comments_count": comments_count,
+        }
+        for pk, likes_count, comments_count in rows
+    }
+
+
+def comment_states(ids):
+    """
+    Returns the counts of the comments with "ids", keyed by id, from one
+    query.
+    """
+    if not ids:
+        return {}
+    rows = (
+        Comment.objects.filter(pk__in=ids)
+        .order_by()
+        .values_list("pk", "likes_count")
+    )
+    return {
+        pk: {"like_id": None, "likes_count": likes_count}
+        for pk, likes_count in rows
+    }
+
+
+def profile_states(ids):
+    """
+    Returns the stored follower counts of the profiles with "ids", keyed by
+    id, from one query.
+    """
+    if not ids:
+        return {}
+    rows = (
+        Profile.objects.filter(pk__in=ids)
+        .order_by()
+        .values_list("pk", "followers_count", "following_count")
+    )
+    return {
+        pk: {
+            "following_id": None,
+            "followers_count": followers_count,
+            "following_count": following_count,
+        }
+        for pk, followers_count, following_count in rows
+    }
+
+
+@api_view()
+def engagement_state(request):
+    """
+    Returns the requesting user's likes and follows on the posts, comments
+    and profiles in the "posts", "comments" and "profiles" query
+    parameters, each a comma separated list of ids, with their current
+    counts. Cards on a page get their state in one request, instead of one
+    request to /likes/ or /followers/ each.
+
+    There's a query for each kind of object asked about, one for the
+    user's likes and one for their follows, however many ids are passed.
+    Ids that don't exist are left out. Anonymous users get null like and
+    following ids.
+    """
+    posts = post_states(engagement_ids(request, "posts"))
+    comments = comment_states(engagement_ids(request, "comments"))
+    profiles = profile_states(engagement_ids(request, "profiles"))
+    user = request.user
+
+    if user.is_authenticated and (posts or comments):
+        likes = Like.objects.filter(owner=user).filter(
+            Q(plant_in_focus_post__in=list(posts))
+            | Q(comment__in=list(comments))
+        )
+        for like_id, post_id, comment_id in likes.order_by().values_list(
+            "id", "plant_in_focus_post_id", "comment_id"
+        ):
+            if post_id in posts:
+                posts[post_id]["like_id"] = like_id
+            if comment_id in comments:
+                comments[comment_id]["like_id"] = like_id
+
+    if user.is_authenticated and profiles:
+        follows = Follower.objects.filter(
+            owner=user, followed__profile__in=list(profiles)
+        )
+        for follow_id, profile_id in follows.order_by().values_list(
+            "id", "followed__profile"
+        ):
+            profiles[profile_id]["following_id"] = follow_id
+
+    return Response(
+        {"posts": posts, "comments": comments, "profiles": profiles}
+    )
+
+
+def pending_upload(request, path):
+    """
+    Serves a deferred upload that hasn't been pushed to the storage backend
+    yet, from the database, see foraging_api/uploads.py.
+    """
+    try:
+        content = DatabaseStorage().open(path).read()
+    except FileNotFoundError:
+        raise Http404("No such pending upload.")
+    content_type = mimetypes.guess_type(path)[0]
+    return HttpResponse(
+        content, content_type=content_type or "application/octet-stream"
+    )
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('likes', '0002_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterIncrement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(help_text='Label of the model the counter is on.', max_length=100, verbose_name='Model')),
+                ('object_id', models.BigIntegerField(help_text='Primary key of the row the counter is on.', verbose_name='Object ID')),
+                ('field', models.CharField(help_text="Name of the counter's field.", max_length=50, verbose_name='Field')),
+                ('delta', models.IntegerField(help_text='Amount added to the counter, negative for unlikes.', verbose_name='Delta')),
+            ],
+            options={
+                'verbose_name': 'Counter Increment',
+                'verbose_name_plural': 'Counter Increments',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='counterincrement',
+            index=models.Index(fields=['model_label', 'object_id', 'field'], name='counter_increment_key_idx'),
+        ),
+    ]
@@ -6,8 +6,11 @@ separately and also at the same time.
 """
 
 from django.db import models
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User
 from comments.models import Comment
+from foraging_api.counters import counter_buffer
 from plants_blog.models import PlantInFocusPost
 
 
@@ -81,6 +84,13 @@ class Like(models.Model):
         # Most recent listed first.
         ordering = ["-created_at"]
 
+        # Matches the (created_at, id) ordering used by cursor pagination.
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="like_created_id_idx"
+            ),
+        ]
+
     def __str__(self):
         """
         Returns a string explaining who likes what.
@@ -94,3 +104,97 @@ class Like(models.Model):
             )
         elif self.comment:
             return f"{self.owner.username} likes comment {self.comment.id}"
+
+
+class CounterIncrement(models.Model):
+    """
+    An increment to a stored counter, such as a post's likes_count, that
+    hasn't been written to the counter yet. These are the shared store of
+    the counter buffer, see foraging_api.counters.DatabaseCounterStore.
+    """
+
+    model_label = models.CharField(
+        max_length=100,
+        verbose_name="Model",
+        help_text="Label of the model the counter is on.",
+    )
+    object_id = models.BigIntegerField(
+        verbose_name="Object ID",
+        help_text="Primary key of the row the counter is on.",
+    )
+    field = models.CharField(
+        max_length=50,
+        verbose_name="Field",
+        help_text="Name of the counter's field.",
+    )
+    delta = models.IntegerField(
+        verbose_name="Delta",
+        help_text="Amount added to the counter, negative for unlikes.",
+    )
+
+    class Meta:
+        """
+        The index serves adding up the pending increments to one counter.
+        """
+
+        verbose_name = "Counter Increment"
+        verbose_name_plural = "Counter Increments"
+        indexes = [
+            models.Index(
+                fields=["model_label", "object_id", "field"],
+                name="counter_increment_key_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.model_label} {self.object_id} {self.field} "
+            f"{self.delta:+d}"
+        )
+
+
+def liked_target(like):
+    """
+    Returns the model and pk of the post or comment a like is on.
+    """
+    if like.plant_in_focus_post_id:
+        return PlantInFocusPost, like.plant_in_focus_post_id
+    return Comment, like.comment_id
+
+
+def user_like_id(user, field):
+    """
+    Returns a subquery for the id of "user"'s like of the outer post or
+    comment, "field" being the like's foreign key to it, which is None when
+    the user hasn't liked it.
+    """
+    return Subquery(
+        Like.objects.filter(owner=user, **{field: OuterRef("pk")})
+        .order_by()
+        .values("pk")[:1]
+    )
+
+
+def increment_likes_count(sender, instance, created, **kwargs):
+    """
+    Signal receiver that adds a new like to the stored likes_count of the
+    post or comment it's on, through the counter buffer. A buffered
+    increment waits for the like's transaction to commit, see
+    CounterBuffer.add.
+    """
+    if created:
+        model, pk = liked_target(instance)
+        counter_buffer.add(model, pk, "likes_count", 1)
+
+
+def decrement_likes_count(sender, instance, **kwargs):
+    """
+    Signal receiver that takes a deleted like off the stored likes_count of
+    the post or comment it was on.
+    """
+    model, pk = liked_target(instance)
+    counter_buffer.add(model, pk, "likes_count", -1)
+
+
+post_save.connect(increment_likes_count, sender=Like)
+post_delete.connect(decrement_likes_count, sender=Like)
@@ -5,8 +5,10 @@ Much of the code in this file is copied from the drf-api walkthrough projects
 with Code Institute.
 """
 
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from foraging_api.counters import counter_buffer
+from foraging_api.db import create_or_ignore
 from likes.models import Like
 from plants_blog.models import PlantInFocusPost
 from comments.models import Comment
@@ -84,3 +86,62 @@ class LikeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {"detail": "possible duplicate"}
             )
+
+
+class LikeToggleSerializer(LikeSerializer):
+    """
+    Likes or unlikes a post or comment for the requesting user in one
+    request. With "liked" the like is set to that state, which makes
+    repeating the request harmless, without it the like is flipped.
+    Duplicates never raise IntegrityError, see create_or_ignore.
+    """
+
+    owner = None
+    liked = serializers.BooleanField(required=False, allow_null=True)
+
+    class Meta(LikeSerializer.Meta):
+        fields = ["plant_in_focus_post", "comment", "liked"]
+
+    def save(self):
+        """
+        Applies the like state and returns it, with the id of the user's
+        like and the target's likes count.
+        """
+        liked = self.validated_data.get("liked")
+        target = {
+            field: self.validated_data[field]
+            for field in ("plant_in_focus_post", "comment")
+            if self.validated_data.get(field)
+        }
+        owner = self.context["request"].user
+
+        with transaction.atomic():
+            like = None
+            if liked is not False:
+                like = create_or_ignore(Like, owner=owner, **target)
+            if like is None and liked is not True:
+                # Deleting through the queryset still sends post_delete,
+                # so the stored counters follow.
+                Like.objects.filter(owner=owner, **target).delete()
+            elif like is None:
+                like = Like.objects.filter(owner=owner, **target).first()
+
+        return {
+            "liked": like is not None,
+            "like_id": like.id if like else None,
+            "likes_count": self.get_likes_count(target),
+        }
+
+    def get_likes_count(self, target):
+        """
+        Returns the target's stored likes_count, plus any increments the
+        counter buffer hasn't written yet.
+        """
+        [obj] = target.values()
+        model = type(obj)
+        stored = (
+            model.objects.filter(pk=obj.pk)
+            .values_list("likes_count", flat=True)
+            .get()
+        )
+        return stored + counter_buffer.pending(model, obj.pk, "likes_count")
@@ -4,8 +4,19 @@ They ensure that the basic functions of creation, deletion, and the unique
 constraints function as intended.
 """
 
-from rest_framework.test import APITestCase
+import threading
+from unittest import mock
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
 from django.contrib.auth.models import User
+from foraging_api.counters import (
+    CounterBuffer,
+    DatabaseCounterStore,
+    LocalCounterStore,
+)
+from foraging_api.db import create_or_ignore
+from followers.models import Follower
 from likes.models import Like
 from plants_blog.models import PlantInFocusPost
 from comments.models import Comment
@@ -86,3 +97,402 @@ class LikeModelTest(APITestCase):
         )
         like.delete()
         self.assertEqual(Like.objects.count(), 0)
+
+
+class LikeToggleTest(APITestCase):
+    """
+    Tests liking and unliking through the toggle endpoint.
+    """
+
+    def setUp(self):
+        """
+        Creates a logged in user, a post and a comment on it.
+        """
+        self.user = User.objects.create_user(
+            username="test_user", password="test_password"
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Dandelion",
+            main_plant_month=5,
+            main_plant_environment="Meadows and fields",
+            culinary_uses="Can be used in salads and teas",
+            history_and_folklore="Believed to make people wet their beds",
+            main_plant_parts_used="Leaves, roots, flowers",
+        )
+        self.comment = Comment.objects.create(
+            content="Test Comment", plant_in_focus_post=self.post
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def toggle(self, **data):
+        response = self.client.post("/likes/toggle/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_toggle_flips_the_like(self):
+        """
+        Checks that toggling likes the post, then unlikes it, with the
+        stored likes count following.
+        """
+        state = self.toggle(plant_in_focus_post=self.post.id)
+        like = Like.objects.get()
+        self.assertEqual(
+            state, {"liked": True, "like_id": like.id, "likes_count": 1}
+        )
+        state = self.toggle(plant_in_focus_post=self.post.id)
+        self.assertEqual(
+            state, {"liked": False, "like_id": None, "likes_count": 0}
+        )
+        self.assertFalse(Like.objects.exists())
+
+    def test_repeated_state_is_idempotent(self):
+        """
+        Checks that sending the same "liked" state twice, as a double tap
+        does, leaves a single like.
+        """
+        first = self.toggle(comment=self.comment.id, liked=True)
+        second = self.toggle(comment=self.comment.id, liked=True)
+        self.assertEqual(first, second)
+        self.assertEqual(second["likes_count"], 1)
+
+        self.toggle(comment=self.comment.id, liked=False)
+        state = self.toggle(comment=self.comment.id, liked=False)
+        self.assertEqual(
+            state, {"liked": False, "like_id": None, "likes_count": 0}
+        )
+
+    def test_duplicate_leaves_transaction_usable(self):
+        """
+        Checks that a duplicate like is skipped without an IntegrityError,
+        so the transaction it's in carries on.
+        """
+        with transaction.atomic():
+            like = create_or_ignore(
+                Like, owner=self.user, comment=self.comment
+            )
+            self.assertIsNotNone(like)
+            self.assertIsNone(
+                create_or_ignore(Like, owner=self.user, comment=self.comment)
+            )
+            self.assertEqual(Like.objects.count(), 1)
+
+    def test_target_is_validated(self):
+        """
+        Checks that exactly one of a post or a comment must be given, and
+        that logging in is required.
+        """
+        response = self.client.post(
+            "/likes/toggle/",
+            {"plant_in_focus_post": self.post.id, "comment": self.comment.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.logout()
+        response = self.client.post(
+            "/likes/toggle/", {"comment": self.comment.id}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CounterBufferTest(APITestCase):
+    """
+    Tests the write-behind buffer for the stored like counters.
+    """
+
+    THREADS = 8
+    LIKES = 200
+    UNLIKES = 50
+
+    def setUp(self):
+        """
+        Creates a user, a post and a comment on it.
+        """
+        self.user = User.objects.create_user(
+            username="test_user", password="test_password"
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Dandelion",
+            main_plant_month=5,
+            main_plant_environment="Meadows and fields",
+            culinary_uses="Can be used in salads and teas",
+            history_and_folklore="Believed to make people wet their beds",
+            main_plant_parts_used="Leaves, roots, flowers",
+        )
+        self.comment = Comment.objects.create(
+            content="Test Comment", plant_in_focus_post=self.post
+        )
+
+    def run_concurrently(self, buffer):
+        """
+        Adds likes and unlikes to the post and the comment from several
+        threads, while the buffer is flushed over and over, then checks
+        the flushed totals.
+        """
+
+        def tap():
+            for number in range(self.LIKES):
+                buffer.add(PlantInFocusPost, self.post.pk, "likes_count", 1)
+                buffer.add(Comment, self.comment.pk, "likes_count", 1)
+                if number < self.UNLIKES:
+                    buffer.add(
+                        PlantInFocusPost, self.post.pk, "likes_count", -1
+                    )
+
+        threads = [threading.Thread(target=tap) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            buffer.flush()
+        for thread in threads:
+            thread.join()
+        buffer.flush()
+
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual(
+            self.post.likes_count, self.THREADS * (self.LIKES - self.UNLIKES)
+        )
+        self.assertEqual(self.comment.likes_count, self.THREADS * self.LIKES)
+        self.assertEqual(
+            buffer.pending(PlantInFocusPost, self.post.pk, "likes_count"), 0
+        )
+
+    def test_concurrent_increments_local_store(self):
+        """
+        Checks the in-process store against concurrent increments.
+        """
+        self.run_concurrently(
+            CounterBuffer(LocalCounterStore(), start_worker=False)
+        )
+
+    def test_database_store_flushes_every_process(self):
+        """
+        Checks that a flush through the shared store writes the increments
+        added by other processes, unlikes included.
+        """
+        processes = [DatabaseCounterStore() for _ in range(3)]
+        for store in processes:
+            store.add(
+                ("plants_blog.PlantInFocusPost", self.post.pk, "likes_count"),
+                2,
+            )
+            store.add(
+                ("plants_blog.PlantInFocusPost", self.post.pk, "likes_count"),
+                -1,
+            )
+            store.add(("comments.Comment", self.comment.pk, "likes_count"), 1)
+        buffer = CounterBuffer(DatabaseCounterStore(), start_worker=False)
+        self.assertEqual(
+            buffer.pending(PlantInFocusPost, self.post.pk, "likes_count"), 3
+        )
+
+        self.assertEqual(buffer.flush(), 2)
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual(
+            (self.post.likes_count, self.comment.likes_count), (3, 3)
+        )
+        self.assertEqual(
+            buffer.pending(PlantInFocusPost, self.post.pk, "likes_count"), 0
+        )
+
+    def test_failed_flush_keeps_database_increments(self):
+        """
+        Checks that increments taken out of the shared store by a flush
+        that fails are still pending afterwards, and only once.
+        """
+        buffer = CounterBuffer(DatabaseCounterStore(), start_worker=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.add(Comment, self.comment.pk, "likes_count", 1)
+        with mock.patch(
+            "foraging_api.counters.flush_counts", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(
+            buffer.pending(Comment, self.comment.pk, "likes_count"), 1
+        )
+
+    def test_rolled_back_like_not_buffered(self):
+        """
+        Checks that a like whose transaction is rolled back leaves no
+        increment behind in the buffer.
+        """
+        buffer = CounterBuffer(LocalCounterStore(), start_worker=False)
+        with mock.patch("likes.models.counter_buffer", buffer):
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Like.objects.create(
+                            owner=self.user, comment=self.comment
+                        )
+                        Like.objects.create(
+                            owner=self.user, comment=self.comment
+                        )
+        self.assertEqual(
+            buffer.pending(Comment, self.comment.pk, "likes_count"), 0
+        )
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_counters_never_go_below_zero(self):
+        """
+        Checks that flushing more unlikes than likes leaves a count of 0.
+        """
+        buffer = CounterBuffer(LocalCounterStore(), start_worker=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.add(Comment, self.comment.pk, "likes_count", -3)
+        buffer.flush()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 0)
+
+
+class CounterBufferToggleTest(APITransactionTestCase):
+    """
+    Tests the buffered like counters through the toggle endpoint, with the
+    transactions committed as they would be outside the tests.
+    """
+
+    def setUp(self):
+        """
+        Creates a user, a post and a comment on it.
+        """
+        self.user = User.objects.create_user(
+            username="test_user", password="test_password"
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Dandelion",
+            main_plant_month=5,
+            main_plant_environment="Meadows and fields",
+            culinary_uses="Can be used in salads and teas",
+            history_and_folklore="Believed to make people wet their beds",
+            main_plant_parts_used="Leaves, roots, flowers",
+        )
+        self.comment = Comment.objects.create(
+            content="Test Comment", plant_in_focus_post=self.post
+        )
+
+    def test_likes_are_written_on_flush(self):
+        """
+        Checks that buffered likes only reach the row when flushed, and
+        that the toggle endpoint counts them in before that.
+        """
+        buffer = CounterBuffer(LocalCounterStore(), start_worker=False)
+        self.client.force_authenticate(user=self.user)
+        with mock.patch("likes.models.counter_buffer", buffer), mock.patch(
+            "likes.serializers.counter_buffer", buffer
+        ):
+            response = self.client.post(
+                "/likes/toggle/", {"comment": self.comment.id}, format="json"
+            )
+            self.assertEqual(response.data["likes_count"], 1)
+            self.comment.refresh_from_db()
+            self.assertEqual(self.comment.likes_count, 0)
+
+            self.assertEqual(buffer.flush(), 1)
+            self.comment.refresh_from_db()
+            self.assertEqual(self.comment.likes_count, 1)
+
+
+class EngagementStateTest(APITestCase):
+    """
+    Tests the bulk engagement state endpoint.
+    """
+
+    def setUp(self):
+        """
+        Creates a user who likes some of a set of posts and comments and
+        follows another user.
+        """
+        self.user = User.objects.create_user(
+            username="test_user", password="test_password"
+        )
+        self.other_user = User.objects.create_user(
+            username="other_user", password="other_password"
+        )
+        self.posts = [
+            PlantInFocusPost.objects.create(
+                main_plant_name=f"Plant {number}",
+                main_plant_month=5,
+                main_plant_environment="Meadows and fields",
+                culinary_uses="Can be used in salads and teas",
+                history_and_folklore="Folklore",
+                main_plant_parts_used="Leaves",
+            )
+            for number in range(10)
+        ]
+        self.comments = [
+            Comment.objects.create(
+                content="Comment", plant_in_focus_post=post
+            )
+            for post in self.posts
+        ]
+        self.post_like = Like.objects.create(
+            owner=self.user, plant_in_focus_post=self.posts[0]
+        )
+        self.comment_like = Like.objects.create(
+            owner=self.user, comment=self.comments[1]
+        )
+        self.follow = Follower.objects.create(
+            owner=self.user, followed=self.other_user
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def get_state(self, posts=(), comments=(), profiles=()):
+        query = {
+            "posts": ",".join(str(obj.id) for obj in posts),
+            "comments": ",".join(str(obj.id) for obj in comments),
+            "profiles": ",".join(str(obj.id) for obj in profiles),
+        }
+        response = self.client.get("/engagement/", query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_state_of_every_object(self):
+        """
+        Checks the like and following ids and the counts returned.
+        """
+        profiles = [self.user.profile, self.other_user.profile]
+        state = self.get_state(self.posts[:2], self.comments[:2], profiles)
+        self.assertEqual(
+            state["posts"][self.posts[0].id],
+            {
+                "like_id": self.post_like.id,
+                "likes_count": 1,
+                "comments_count": 1,
+            },
+        )
+        self.assertIsNone(state["posts"][self.posts[1].id]["like_id"])
+        self.assertEqual(
+            state["comments"][self.comments[1].id],
+            {"like_id": self.comment_like.id, "likes_count": 1},
+        )
+        self.assertEqual(
+            state["profiles"][self.other_user.profile.id],
+            {
+                "following_id": self.follow.id,
+                "followers_count": 1,
+                "following_count": 0,
+            },
+        )
+        self.assertIsNone(
+            state["profiles"][self.user.profile.id]["following_id"]
+        )
+
+    def test_query_count_is_fixed(self):
+        """
+        Checks that asking about ten times as many objects costs no more
+        queries.
+        """
+        profiles = [self.other_user.profile]
+        with self.assertNumQueries(5):
+            self.get_state(self.posts[:1], self.comments[:1], profiles)
+        with self.assertNumQueries(5):
+            state = self.get_state(self.posts, self.comments, profiles)
+        self.assertEqual(len(state["posts"]), 10)
+
+    def test_invalid_ids_are_rejected(self):
+        """
+        Checks that ids have to be numbers.
+        """
+        response = self.client.get("/engagement/", {"posts": "1,two"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
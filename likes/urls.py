@@ -16,6 +16,12 @@ urlpatterns = [
         views.LikeList.as_view(),
         name="like_list",
     ),
+    path(
+        # URL pattern for liking or unliking in one request.
+        "toggle/",
+        views.LikeToggle.as_view(),
+        name="like_toggle",
+    ),
     path(
         # URL pattern for retrieving and deletion of a specific like by its ID
         "<int:pk>/",
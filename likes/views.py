@@ -7,17 +7,20 @@ project with Code Institute.
 """
 
 from rest_framework import generics, permissions
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from likes.models import Like
-from likes.serializers import LikeSerializer
+from likes.serializers import LikeSerializer, LikeToggleSerializer
+from foraging_api.pagination import OptionalCursorPaginationMixin
 from foraging_api.permissions import IsOwnerOrReadOnly
 
 
-class LikeList(generics.ListCreateAPIView):
+class LikeList(OptionalCursorPaginationMixin, generics.ListCreateAPIView):
     """
     Inherits from ListCreateAPIView which allows it to read and write.
     IsAuthenticatedOrReadOnly allows all users to see likes but only
     authenticated users are able to like.
+    Supports cursor pagination with "?pagination=cursor".
     """
 
     # Queryset that returns all Like objects
@@ -52,3 +55,21 @@ class LikeDetail(generics.RetrieveDestroyAPIView):
     serializer_class = LikeSerializer
     # Only owners of a like object are able to destroy it.
     permission_classes = [IsOwnerOrReadOnly]
+
+
+class LikeToggle(generics.GenericAPIView):
+    """
+    Likes or unlikes a post or comment in a single POST, replacing the
+    create-then-delete round trip through LikeList and LikeDetail.
+    Send "plant_in_focus_post" or "comment", and "liked" to set the state
+    rather than flip it. Responds with the new state: "liked", "like_id"
+    and "likes_count".
+    """
+
+    serializer_class = LikeToggleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
@@ -0,0 +1,58 @@
+"""
+Search backend for the PlantInFocusPost list.
+
+On PostgreSQL, searches run against the weighted "search_vector" column and
+its GIN index, and the results are ranked so the best matches come first,
+with the plant's name counting most. The SQLite development database has no
+full-text search, so it falls back to DRF's standard "icontains" search over
+the view's "search_fields".
+"""
+
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+from foraging_api.db import is_postgresql
+
+
+class PlantInFocusPostSearchFilter(filters.SearchFilter):
+    """
+    Full-text, ranked search over posts, falling back to SearchFilter's
+    "icontains" search when the database isn't PostgreSQL.
+    """
+
+    def get_tsquery_text(self, search_terms):
+        """
+        Builds a raw tsquery matching posts that contain every search term,
+        with each term treated as a prefix so partly typed words still match.
+        Anything other than letters and digits is stripped, so the input
+        can't break the tsquery syntax. Returns None if no words are left.
+        """
+        words = [re.sub(r"\W+", "", term) for term in search_terms]
+        words = [word for word in words if word]
+        if not words:
+            return None
+        return " & ".join(f"{word}:*" for word in words)
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_postgresql():
+            return super().filter_queryset(request, queryset, view)
+
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        tsquery = self.get_tsquery_text(search_terms)
+        if tsquery is None:
+            return queryset.none()
+
+        query = SearchQuery(tsquery, search_type="raw", config="english")
+
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F("search_vector"), query)
+        )
+        # Best matches first, unless the client asked for an ordering.
+        if api_settings.ORDERING_PARAM not in request.query_params:
+            queryset = queryset.order_by("-search_rank", "-created_at")
+        return queryset
@@ -0,0 +1,31 @@
+"""
+Management command that pushes every image still staged by the deferred
+uploads to the storage backend.
+
+Uploads are normally pushed by a background thread a moment after they're
+saved, but a restart or a failed upload can leave some behind. Their rows
+still hold a "pending/" name, which is how they're found. It covers posts
+and profiles, all of the models registered in foraging_api/uploads.py.
+
+Usage:
+    python manage.py push_pending_uploads
+"""
+
+from django.core.management.base import BaseCommand
+from foraging_api.uploads import UploadQueue, find_pending_uploads
+
+
+class Command(BaseCommand):
+    help = "Pushes images left pending by deferred uploads."
+
+    def handle(self, *args, **options):
+        pending = UploadQueue(start_worker=False)
+        total = 0
+        for job in find_pending_uploads():
+            pending.enqueue(job)
+            total += 1
+        pending.drain()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {total} pending uploads.")
+        )
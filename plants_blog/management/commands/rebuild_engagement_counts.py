@@ -0,0 +1,127 @@
+"""
+Management command that recalculates the stored comments_count and
+likes_count on every PlantInFocusPost, and the likes_count on every
+Comment.
+
+The counters are normally kept correct by signal receivers, but rows that
+were changed outside of the ORM (raw SQL, restored backups) can leave them
+out of step, as can a process dying with likes still in the "local" counter
+buffer. Rows are processed in chunks ordered by primary key so a large
+table is never loaded into memory, or locked, all at once. Increments
+waiting in the shared counter buffer for a rebuilt row are dropped along
+with the old value, as the recount already includes them.
+
+Usage:
+    python manage.py rebuild_engagement_counts --chunk-size 500
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from comments.models import Comment
+from likes.models import CounterIncrement, Like
+from plants_blog.models import PlantInFocusPost
+
+
+def count_by(queryset, field, pks):
+    """
+    Returns the number of rows of "queryset" for each of "pks" in "field",
+    with a grouped query.
+    """
+    # order_by() clears the models' default ordering, which would
+    # otherwise be added to the GROUP BY.
+    return dict(
+        queryset.filter(**{f"{field}__in": pks})
+        .order_by()
+        .values_list(field)
+        .annotate(total=Count("pk"))
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the stored comments_count and likes_count on posts, and "
+        "likes_count on comments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of posts or comments recalculated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        posts = self.rebuild(PlantInFocusPost, self.rebuild_posts, chunk_size)
+        comments = self.rebuild(Comment, self.rebuild_comments, chunk_size)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt engagement counts for {posts} posts and "
+                f"{comments} comments."
+            )
+        )
+
+    def rebuild(self, model, rebuild_chunk, chunk_size):
+        """
+        Runs "rebuild_chunk" over every row of "model", one transaction per
+        chunk, and returns the number of rows.
+        """
+        last_pk = 0
+        total = 0
+
+        while True:
+            pks = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not pks:
+                break
+
+            with transaction.atomic():
+                rebuild_chunk(pks)
+                CounterIncrement.objects.filter(
+                    model_label=model._meta.label, object_id__in=pks
+                ).delete()
+
+            total += len(pks)
+            last_pk = pks[-1]
+        return total
+
+    def rebuild_posts(self, pks):
+        """
+        Counts the comments and likes for one chunk of posts with a grouped
+        query per table, then writes them back with a single bulk update.
+        """
+        comments_counts = count_by(
+            Comment.objects.all(), "plant_in_focus_post_id", pks
+        )
+        likes_counts = count_by(
+            Like.objects.all(), "plant_in_focus_post_id", pks
+        )
+
+        posts = [
+            PlantInFocusPost(
+                pk=pk,
+                comments_count=comments_counts.get(pk, 0),
+                likes_count=likes_counts.get(pk, 0),
+            )
+            for pk in pks
+        ]
+        PlantInFocusPost.objects.bulk_update(
+            posts, ["comments_count", "likes_count"]
+        )
+
+    def rebuild_comments(self, pks):
+        """
+        Counts the likes for one chunk of comments, then writes them back
+        with a single bulk update.
+        """
+        likes_counts = count_by(Like.objects.all(), "comment_id", pks)
+        comments = [
+            Comment(pk=pk, likes_count=likes_counts.get(pk, 0)) for pk in pks
+        ]
+        Comment.objects.bulk_update(comments, ["likes_count"])
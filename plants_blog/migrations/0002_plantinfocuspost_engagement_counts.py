@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:06
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_engagement_counts(apps, schema_editor):
+    """
+    Fills in the new counters for posts that already exist. Later drift is
+    handled by the "rebuild_engagement_counts" management command.
+    """
+    PlantInFocusPost = apps.get_model('plants_blog', 'PlantInFocusPost')
+    Comment = apps.get_model('comments', 'Comment')
+    Like = apps.get_model('likes', 'Like')
+
+    def count_of(model):
+        counted = (
+            model.objects.filter(plant_in_focus_post=OuterRef('pk'))
+            .order_by()
+            .values('plant_in_focus_post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(counted), Value(0))
+
+    PlantInFocusPost.objects.update(
+        comments_count=count_of(Comment),
+        likes_count=count_of(Like),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants_blog', '0001_initial'),
+        ('comments', '0002_alter_comment_plant_in_focus_post'),
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantinfocuspost',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of comments on the post, including replies.', verbose_name='Comments Count'),
+        ),
+        migrations.AddField(
+            model_name='plantinfocuspost',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of likes on the post.', verbose_name='Likes Count'),
+        ),
+        migrations.AddIndex(
+            model_name='plantinfocuspost',
+            index=models.Index(fields=['-created_at'], name='plant_post_created_idx'),
+        ),
+        migrations.RunPython(
+            populate_engagement_counts, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:08
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from foraging_api.db import RunSQLOnPostgreSQL, is_postgresql
+
+
+def populate_search_vector(apps, schema_editor):
+    """
+    Builds the search vector for posts that already exist. Only PostgreSQL
+    has full-text search, so other databases are skipped.
+    """
+    if not is_postgresql(schema_editor.connection):
+        return
+    PlantInFocusPost = apps.get_model('plants_blog', 'PlantInFocusPost')
+    PlantInFocusPost.objects.update(
+        search_vector=(
+            SearchVector('main_plant_name', weight='A', config='english')
+            + SearchVector('confusable_plant_name', weight='B', config='english')
+            + SearchVector('main_plant_environment', weight='C', config='english')
+            + SearchVector('culinary_uses', weight='C', config='english')
+            + SearchVector('medicinal_uses', weight='C', config='english')
+            + SearchVector('history_and_folklore', weight='D', config='english')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants_blog', '0002_plantinfocuspost_engagement_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantinfocuspost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted full-text search vector for the post.', null=True, verbose_name='Search Vector'),
+        ),
+        RunSQLOnPostgreSQL(
+            sql='CREATE INDEX plant_post_search_vector_gin '
+            'ON plants_blog_plantinfocuspost USING gin (search_vector);',
+            reverse_sql='DROP INDEX IF EXISTS plant_post_search_vector_gin;',
+        ),
+        migrations.RunPython(
+            populate_search_vector, migrations.RunPython.noop
+        ),
+    ]
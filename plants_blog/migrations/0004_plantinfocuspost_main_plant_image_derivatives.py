@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants_blog', '0003_plantinfocuspost_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantinfocuspost',
+            name='main_plant_image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Names of the resized copies of the main plant image.', verbose_name='Main Plant Image Derivatives'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants_blog', '0004_plantinfocuspost_main_plant_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name of the file, without the pending prefix.', max_length=255, unique=True, verbose_name='Name')),
+                ('content', models.BinaryField(help_text="The file's contents.", verbose_name='Content')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When the file was uploaded.', verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Pending Upload',
+                'verbose_name_plural': 'Pending Uploads',
+            },
+        ),
+    ]
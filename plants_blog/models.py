@@ -15,7 +15,41 @@ protected.
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.exceptions import ValidationError
+from foraging_api.db import fields_to_update, is_postgresql
+from foraging_api.images import PLANT_CARD_SIZES
+from foraging_api.uploads import (
+    register_deferred_uploads,
+    register_derivatives,
+)
+
+
+# Weights used when building a post's full-text search vector. The plant's
+# name is weighted highest, so a search for a plant ranks its own post above
+# posts that only mention it in passing.
+SEARCH_VECTOR_WEIGHTS = [
+    ("main_plant_name", "A"),
+    ("confusable_plant_name", "B"),
+    ("main_plant_environment", "C"),
+    ("culinary_uses", "C"),
+    ("medicinal_uses", "C"),
+    ("history_and_folklore", "D"),
+]
+
+
+def post_search_vector():
+    """
+    Returns the weighted SearchVector expression for a PlantInFocusPost.
+    """
+    vectors = [
+        SearchVector(field, weight=weight, config="english")
+        for field, weight in SEARCH_VECTOR_WEIGHTS
+    ]
+    combined = vectors[0]
+    for vector in vectors[1:]:
+        combined = combined + vector
+    return combined
 
 
 class PlantInFocusPost(models.Model):
@@ -137,6 +171,17 @@ class PlantInFocusPost(models.Model):
         help_text="Upload an image of the main plant.",
     )
 
+    # Resized copies of the main plant image for the post cards, keyed by
+    # width. Generated in the background when a new image is uploaded, see
+    # register_derivatives.
+    main_plant_image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Main Plant Image Derivatives",
+        help_text="Names of the resized copies of the main plant image.",
+    )
+
     # Details of plants that may be mistaken for the main_plant of interest.
     # Optional to be filled in as it may not always be applicable.
     confusable_plant_name = models.CharField(
@@ -171,6 +216,50 @@ class PlantInFocusPost(models.Model):
         blank=True,
     )
 
+    # Stored engagement counters. They're kept up to date by the Comment and
+    # Like signal receivers, so listing posts doesn't have to join and count
+    # the comments and likes tables on every request.
+    # "rebuild_engagement_counts" puts them right if they ever drift.
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Comments Count",
+        help_text="Number of comments on the post, including replies.",
+    )
+
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Likes Count",
+        help_text="Number of likes on the post.",
+    )
+
+    # Weighted full-text search vector, refreshed whenever the post is saved.
+    # It's only populated on PostgreSQL, where a GIN index is added to it by
+    # migration. The SQLite development database leaves it empty.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Search Vector",
+        help_text="Weighted full-text search vector for the post.",
+    )
+
+    # Columns only written with queries of their own, which a save of an
+    # existing post leaves alone.
+    STORED_FIELDS = ("comments_count", "likes_count", "search_vector")
+
+    class Meta:
+        """
+        Index on the creation date, matching the newest first ordering used
+        by the list view.
+        """
+
+        indexes = [
+            models.Index(
+                fields=["-created_at"], name="plant_post_created_idx"
+            ),
+        ]
+
     def clean(self):
         """
         Validates the model's data before saving by doing the following:
@@ -201,13 +290,71 @@ class PlantInFocusPost(models.Model):
         Validates the model and saves it to the database.
         Running a `full_clean()`, it ensures all fields and custom validation
         is correct. If everything is valid, the model is saved using Django's
-        default process.
-
+        default process, after which the search vector is refreshed.
+        Saving an existing post leaves out the stored counters and search
+        vector, so a post loaded before a comment or like came in doesn't
+        write the old counts back.
         """
 
         self.full_clean()
+        if not self._state.adding:
+            kwargs["update_fields"] = fields_to_update(
+                self, self.STORED_FIELDS, kwargs.get("update_fields")
+            )
         super().save(*args, **kwargs)
 
+        # The search vector is built by the database from the saved text,
+        # which needs PostgreSQL.
+        if is_postgresql():
+            PlantInFocusPost.objects.filter(pk=self.pk).update(
+                search_vector=post_search_vector()
+            )
+
     # String representation, returning the name of the main plant.
     def __str__(self):
         return self.main_plant_name
+
+
+# New images are pushed to the storage backend in the background when
+# deferred uploads are switched on.
+register_deferred_uploads(
+    PlantInFocusPost, "main_plant_image", "confusable_plant_image"
+)
+# The card sizes of new main plant images are generated in the background.
+register_derivatives(PlantInFocusPost, "main_plant_image", PLANT_CARD_SIZES)
+
+
+class PendingUpload(models.Model):
+    """
+    A newly uploaded file waiting to be pushed to the storage backend. These
+    are the staging area of the deferred uploads, see
+    foraging_api.uploads.DatabaseStorage, kept in the database so every
+    dyno can read them and they outlive restarts.
+    """
+
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name="Name",
+        help_text="Name of the file, without the pending prefix.",
+    )
+    content = models.BinaryField(
+        verbose_name="Content",
+        help_text="The file's contents.",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Created At",
+        help_text="When the file was uploaded.",
+    )
+
+    class Meta:
+        """
+        The unique name is also the index the files are looked up by.
+        """
+
+        verbose_name = "Pending Upload"
+        verbose_name_plural = "Pending Uploads"
+
+    def __str__(self):
+        return self.name
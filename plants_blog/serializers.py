@@ -7,27 +7,104 @@ and from JSON format.
 """
 
 from rest_framework import serializers
+from foraging_api.images import (
+    AVATAR_SIZES,
+    PLANT_CARD_SIZES,
+    ImageSrcsetField,
+    ImageUploadValidator,
+    StorageURLField,
+)
+from foraging_api.serializers import BatchedListSerializer
 from plants_blog.models import PlantInFocusPost
 from likes.models import Like
 
 
-class PlantInFocusPostSerializer(serializers.ModelSerializer):
+class PostLikeIdMixin:
+    """
+    Provides like_id for the post serializers, resolved for a whole page of
+    posts at once when used with BatchedListSerializer.
+    """
+
+    def resolve_page(self, posts):
+        """
+        Fetches the current user's likes for every post on the page in one
+        query and keeps them in the context, keyed by post id, for
+        get_like_id to read. Anonymous users have no likes to look up.
+        """
+        user = self.context["request"].user
+        if not user.is_authenticated:
+            return
+        like_ids = self.context.setdefault("post_like_ids", {})
+        like_ids.update((post.pk, None) for post in posts)
+        like_ids.update(
+            Like.objects.filter(owner=user, plant_in_focus_post__in=posts)
+            .order_by()
+            .values_list("plant_in_focus_post_id", "id")
+        )
+
+    def get_like_id(self, obj):
+        """
+        Returns the ID of the Like object for the current user and the
+        specified post, enabling toggling between like and unlike.
+        Posts on a list page are answered from the likes fetched by
+        resolve_page, a single post is looked up on its own.
+        """
+        like_ids = self.context.get("post_like_ids", {})
+        if obj.pk in like_ids:
+            return like_ids[obj.pk]
+        user = self.context["request"].user
+        if user.is_authenticated:
+            like = Like.objects.filter(
+                owner=user, plant_in_focus_post=obj
+            ).first()
+            return like.id if like else None
+        return None
+
+
+class PlantInFocusPostSerializer(
+    PostLikeIdMixin, serializers.ModelSerializer
+):
     """
     Serializes PlantInFocusPost instances to and from JSON format.
     It includes image validation and returns ValidationError messages as
-    strings that include the image_field in a string.
+    strings that include the image field's name.
     """
 
     owner = serializers.ReadOnlyField(source="owner.username")
     is_owner = serializers.SerializerMethodField()
     profile_id = serializers.ReadOnlyField(source="owner.profile.id")
-    profile_image = serializers.ReadOnlyField(
-        source="owner.profile.image.url"
+    profile_image = StorageURLField(source="owner.profile.image")
+    # Avatar thumbnail and post card image URLs, keyed by size.
+    profile_image_srcset = ImageSrcsetField(
+        "image", AVATAR_SIZES, source="owner.profile"
+    )
+    main_plant_image_srcset = ImageSrcsetField(
+        "main_plant_image", PLANT_CARD_SIZES, source="*"
     )
     like_id = serializers.SerializerMethodField()
     likes_count = serializers.ReadOnlyField()
     comments_count = serializers.ReadOnlyField()
 
+    # Uploads are checked from the image header, limiting the size to 2MB
+    # and the dimensions to 4096 pixels, without decoding the image.
+    main_plant_image = serializers.FileField(
+        required=False,
+        validators=[
+            ImageUploadValidator(
+                "Main Plant Image", max_width=4096, max_height=4096
+            )
+        ],
+    )
+    confusable_plant_image = serializers.FileField(
+        required=False,
+        allow_null=True,
+        validators=[
+            ImageUploadValidator(
+                "Confusable Plant Image", max_width=4096, max_height=4096
+            )
+        ],
+    )
+
     def validate_main_plant_parts_used(self, value):
         """
         Ensures "main_plant_parts_used" is not left as "Unknown" to prompt
@@ -47,53 +124,14 @@ class PlantInFocusPostSerializer(serializers.ModelSerializer):
         request = self.context.get("request", None)
         return request and request.user == obj.owner
 
-    def get_like_id(self, obj):
-        """
-        Returns the ID of the Like object for the current user and the
-        specified post, enabling toggling between like and unlike.
-        """
-        user = self.context["request"].user
-        if user.is_authenticated:
-            like = Like.objects.filter(
-                owner=user, plant_in_focus_post=obj
-            ).first()
-            return like.id if like else None
-        return None
-
-    def validate_image(self, value, image_field):
-        """
-        Validates the image size and dimensions, replacing "image_field" with
-        the actual field name in the error message.
-        """
-        if value.size > 2 * 1024 * 1024:
-            raise serializers.ValidationError(
-                f"{image_field} size cannot exceed 2MB.",
-            )
-
-        if value.image.height > 4096:
-            raise serializers.ValidationError(
-                f"{image_field} height cannot exceed 4096 pixels."
-            )
-
-        if value.image.width > 4096:
-            raise serializers.ValidationError(
-                f"{image_field} width cannot exceed 4096 pixels."
-            )
-
-        return value
-
-    def validate_main_plant_image(self, value):
-        return self.validate_image(value, "Main Plant Image")
-
-    def validate_confusable_plant_image(self, value):
-        return self.validate_image(value, "Confusable Plant Image")
-
     class Meta:
         """
         Specifies the model and the fields that will be serialized.
         """
 
         model = PlantInFocusPost
+        # Resolves like_id for a whole page of posts at once.
+        list_serializer_class = BatchedListSerializer
 
         fields = [
             "id",
@@ -101,6 +139,7 @@ class PlantInFocusPostSerializer(serializers.ModelSerializer):
             "is_owner",
             "profile_id",
             "profile_image",
+            "profile_image_srcset",
             "created_at",
             "updated_at",
             "main_plant_name",
@@ -110,6 +149,7 @@ class PlantInFocusPostSerializer(serializers.ModelSerializer):
             "medicinal_uses",
             "history_and_folklore",
             "main_plant_image",
+            "main_plant_image_srcset",
             "main_plant_parts_used",
             "main_plant_warnings",
             "confusable_plant_name",
@@ -120,3 +160,42 @@ class PlantInFocusPostSerializer(serializers.ModelSerializer):
             "likes_count",
             "like_id",
         ]
+
+
+class PlantInFocusPostSummarySerializer(
+    PostLikeIdMixin, serializers.ModelSerializer
+):
+    """
+    Read-only card representation of a PlantInFocusPost for the post list
+    screen. It leaves out the long text fields, which the list never shows,
+    and only needs the columns loaded by PlantInFocusPostSummaryList.
+    """
+
+    like_id = serializers.SerializerMethodField()
+    likes_count = serializers.ReadOnlyField()
+    comments_count = serializers.ReadOnlyField()
+    # Post card image URLs, keyed by width.
+    main_plant_image_srcset = ImageSrcsetField(
+        "main_plant_image", PLANT_CARD_SIZES, source="*"
+    )
+
+    class Meta:
+        """
+        Specifies the model and the fields that make up a post card.
+        """
+
+        model = PlantInFocusPost
+        # Resolves like_id for a whole page of posts at once.
+        list_serializer_class = BatchedListSerializer
+
+        fields = [
+            "id",
+            "main_plant_name",
+            "main_plant_month",
+            "main_plant_image",
+            "main_plant_image_srcset",
+            "comments_count",
+            "likes_count",
+            "like_id",
+        ]
+        read_only_fields = fields
@@ -10,9 +10,18 @@ For more information on writing tests using Django Rest Framework, refer to:
 https://www.django-rest-framework.org/api-guide/testing/
 """
 
+from io import StringIO
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
+from comments.models import Comment
+from foraging_api.counters import DatabaseCounterStore
+from likes.models import CounterIncrement, Like
+from plants_blog.filters import PlantInFocusPostSearchFilter
+from plants_blog.models import PlantInFocusPost
 
 
 class PlantInFocusPostListViewTests(APITestCase):
@@ -84,3 +93,439 @@ class PlantInFocusPostListViewTests(APITestCase):
         print("Response Content:", response.content)
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PlantInFocusPostCountsTests(APITestCase):
+    """
+    Tests that the stored comments_count and likes_count on a post follow
+    the comments and likes being created and deleted, and that the rebuild
+    command can put them right.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and a post for the comments and likes to be added to.
+        """
+        self.user = User.objects.create_user(
+            username="regular_user",
+            password="user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Dandelion",
+            main_plant_month=5,
+            main_plant_environment="Meadows and fields",
+            culinary_uses="Can be used in salads and teas",
+            history_and_folklore="Symbol of resilience in folklore",
+            main_plant_parts_used="Leaves, roots, flowers",
+        )
+
+    def test_counts_follow_comments_and_likes(self):
+        """
+        Checks that comments, replies and likes are added to the counts when
+        created and taken off again when deleted.
+        """
+        comment = Comment.objects.create(
+            owner=self.user, plant_in_focus_post=self.post, content="Nice"
+        )
+        Comment.objects.create(
+            owner=self.user,
+            plant_in_focus_post=self.post,
+            replying_comment=comment,
+            content="Reply",
+        )
+        like = Like.objects.create(
+            owner=self.user, plant_in_focus_post=self.post
+        )
+        # A like on a comment shouldn't count towards the post.
+        Like.objects.create(owner=self.user, comment=comment)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(self.post.likes_count, 1)
+
+        # Deleting the comment also deletes its reply.
+        comment.delete()
+        like.delete()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_saving_stale_post_keeps_counts(self):
+        """
+        Checks that saving a post loaded before a comment and like were
+        added doesn't write its old counts back over them.
+        """
+        stale = PlantInFocusPost.objects.get(pk=self.post.pk)
+        Comment.objects.create(
+            owner=self.user, plant_in_focus_post=self.post, content="Nice"
+        )
+        Like.objects.create(owner=self.user, plant_in_focus_post=self.post)
+
+        stale.culinary_uses = "Fritters"
+        stale.save()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.culinary_uses, "Fritters")
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.likes_count, 1)
+
+    def test_list_returns_stored_counts(self):
+        """
+        Checks that the list view returns the stored counts.
+        """
+        Like.objects.create(owner=self.user, plant_in_focus_post=self.post)
+        response = self.client.get("/plants_blog/posts/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["likes_count"], 1)
+        self.assertEqual(response.data["results"][0]["comments_count"], 0)
+
+    def test_rebuild_engagement_counts_command(self):
+        """
+        Checks that the management command recalculates counters that have
+        drifted away from the real number of rows.
+        """
+        Comment.objects.create(
+            owner=self.user, plant_in_focus_post=self.post, content="Nice"
+        )
+        PlantInFocusPost.objects.filter(pk=self.post.pk).update(
+            comments_count=7, likes_count=3
+        )
+
+        call_command(
+            "rebuild_engagement_counts", chunk_size=1, stdout=StringIO()
+        )
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_rebuild_engagement_counts_comment_likes(self):
+        """
+        Checks that the management command recalculates the likes_count of
+        comments too, and drops the increments the counter buffer still
+        holds for them.
+        """
+        comment = Comment.objects.create(
+            owner=self.user, plant_in_focus_post=self.post, content="Nice"
+        )
+        Like.objects.create(owner=self.user, comment=comment)
+        Comment.objects.filter(pk=comment.pk).update(likes_count=5)
+        DatabaseCounterStore().add(
+            ("comments.Comment", comment.pk, "likes_count"), 1
+        )
+
+        call_command(
+            "rebuild_engagement_counts", chunk_size=1, stdout=StringIO()
+        )
+
+        comment.refresh_from_db()
+        self.assertEqual(comment.likes_count, 1)
+        self.assertFalse(CounterIncrement.objects.exists())
+
+
+class PlantInFocusPostLikeIdTests(APITestCase):
+    """
+    Tests that like_id on the post list is resolved for the whole page with
+    a single query, and gives the same answers as the per-post lookup.
+    """
+
+    def setUp(self):
+        """
+        Creates an admin who owns three posts and a user who likes one of
+        them.
+        """
+        self.admin_user = User.objects.create_superuser(
+            username="admin_user",
+            password="admin_password",
+        )
+        self.normal_user = User.objects.create_user(
+            username="regular_user",
+            password="user_password",
+        )
+        self.posts = [
+            PlantInFocusPost.objects.create(
+                owner=self.admin_user,
+                main_plant_name=name,
+                main_plant_month=5,
+                main_plant_environment="Meadows and fields",
+                culinary_uses="Can be used in salads and teas",
+                history_and_folklore="Symbol of resilience in folklore",
+                main_plant_parts_used="Leaves, roots, flowers",
+            )
+            for name in ["Dandelion", "Nettle", "Wild Garlic"]
+        ]
+        self.like = Like.objects.create(
+            owner=self.normal_user, plant_in_focus_post=self.posts[1]
+        )
+
+    def test_list_like_ids_use_one_query(self):
+        """
+        Checks that an authenticated page of posts costs the ETag's count
+        and page queries, the count query, the page query and one query for
+        the user's likes.
+        """
+        self.client.force_authenticate(user=self.normal_user)
+        with self.assertNumQueries(5):
+            response = self.client.get("/plants_blog/posts/")
+
+        like_ids = {
+            post["id"]: post["like_id"] for post in response.data["results"]
+        }
+        self.assertEqual(like_ids[self.posts[1].id], self.like.id)
+        self.assertIsNone(like_ids[self.posts[0].id])
+        self.assertIsNone(like_ids[self.posts[2].id])
+
+    def test_anonymous_list_skips_like_lookup(self):
+        """
+        Checks that anonymous users don't trigger a query for likes.
+        """
+        with self.assertNumQueries(4):
+            response = self.client.get("/plants_blog/posts/")
+        for post in response.data["results"]:
+            self.assertIsNone(post["like_id"])
+
+    def test_detail_like_id(self):
+        """
+        Checks that a single post still returns the user's like_id, for
+        the ETag's query, the post with its owner and profile joined in,
+        and the user's like, without loading the search vector.
+        """
+        self.client.force_authenticate(user=self.normal_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f"/plants_blog/posts/{self.posts[1].id}/"
+            )
+        self.assertEqual(response.data["like_id"], self.like.id)
+        self.assertEqual(len(queries), 3)
+        for query in queries.captured_queries:
+            self.assertNotIn("search_vector", query["sql"])
+
+
+class PlantInFocusPostSearchTests(APITestCase):
+    """
+    Tests for searching the post list. The test database is SQLite, so
+    these exercise the "icontains" fallback and the tsquery building.
+    """
+
+    def setUp(self):
+        """
+        Creates two posts with different plants and uses.
+        """
+        PlantInFocusPost.objects.create(
+            main_plant_name="Dandelion",
+            main_plant_month=5,
+            main_plant_environment="Meadows and fields",
+            culinary_uses="Can be used in salads and teas",
+            history_and_folklore="Symbol of resilience in folklore",
+            main_plant_parts_used="Leaves, roots, flowers",
+        )
+        PlantInFocusPost.objects.create(
+            main_plant_name="Nettle",
+            main_plant_month=4,
+            main_plant_environment="Hedgerows",
+            culinary_uses="Soup",
+            history_and_folklore="Woven into cloth",
+            main_plant_parts_used="Young leaves",
+        )
+
+    def test_search_falls_back_to_icontains(self):
+        """
+        Checks that partial words find the matching post on SQLite.
+        """
+        response = self.client.get("/plants_blog/posts/?search=dandel")
+        names = [post["main_plant_name"] for post in response.data["results"]]
+        self.assertEqual(names, ["Dandelion"])
+
+        response = self.client.get("/plants_blog/posts/?search=soup")
+        names = [post["main_plant_name"] for post in response.data["results"]]
+        self.assertEqual(names, ["Nettle"])
+
+    def test_search_query_strips_tsquery_syntax(self):
+        """
+        Checks that search terms are reduced to prefix matched words joined
+        with "&", and that terms with no words in them give no query.
+        """
+        search_filter = PlantInFocusPostSearchFilter()
+        self.assertEqual(
+            search_filter.get_tsquery_text(["wild!", "garl|ic"]),
+            "wild:* & garlic:*",
+        )
+        self.assertIsNone(search_filter.get_tsquery_text(["&|!"]))
+
+
+class PlantInFocusPostSummaryListTests(APITestCase):
+    """
+    Tests for the compact card representation of the post list.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and a post they have liked.
+        """
+        self.normal_user = User.objects.create_user(
+            username="regular_user",
+            password="user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Dandelion",
+            main_plant_month=5,
+            main_plant_environment="Meadows and fields",
+            culinary_uses="Can be used in salads and teas",
+            history_and_folklore="Symbol of resilience in folklore",
+            main_plant_parts_used="Leaves, roots, flowers",
+        )
+        self.like = Like.objects.create(
+            owner=self.normal_user, plant_in_focus_post=self.post
+        )
+
+    def test_summary_returns_card_fields(self):
+        """
+        Checks that each card holds only the card fields, with the counts
+        and the user's like.
+        """
+        self.client.force_authenticate(user=self.normal_user)
+        response = self.client.get("/plants_blog/posts/summary/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        card = response.data["results"][0]
+        self.assertEqual(
+            set(card),
+            {
+                "id",
+                "main_plant_name",
+                "main_plant_month",
+                "main_plant_image",
+                "main_plant_image_srcset",
+                "comments_count",
+                "likes_count",
+                "like_id",
+            },
+        )
+        self.assertEqual(card["likes_count"], 1)
+        self.assertEqual(card["like_id"], self.like.id)
+
+    def test_summary_leaves_long_text_in_the_database(self):
+        """
+        Checks that the long text columns aren't selected.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/plants_blog/posts/summary/")
+        page_query = queries.captured_queries[-1]["sql"]
+        self.assertIn("main_plant_name", page_query)
+        self.assertNotIn("history_and_folklore", page_query)
+        self.assertNotIn("culinary_uses", page_query)
+
+    def test_summary_validators_skip_profiles(self):
+        """
+        Checks that no query of the summary joins the profiles table, which
+        the cards don't show.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/plants_blog/posts/summary/")
+        for query in queries.captured_queries:
+            self.assertNotIn("profiles_profile", query["sql"])
+
+
+class PlantInFocusPostConditionalGetTests(APITestCase):
+    """
+    Tests the ETag and Last-Modified validators on the post views.
+    """
+
+    def setUp(self):
+        """
+        Creates a user and a post.
+        """
+        self.normal_user = User.objects.create_user(
+            username="regular_user",
+            password="user_password",
+        )
+        self.post = PlantInFocusPost.objects.create(
+            main_plant_name="Dandelion",
+            main_plant_month=5,
+            main_plant_environment="Meadows and fields",
+            culinary_uses="Can be used in salads and teas",
+            history_and_folklore="Symbol of resilience in folklore",
+            main_plant_parts_used="Leaves, roots, flowers",
+        )
+        self.url = f"/plants_blog/posts/{self.post.id}/"
+
+    def test_unchanged_post_returns_304(self):
+        """
+        Checks that sending back the ETag of an unchanged post gets a 304
+        with no body.
+        """
+        response = self.client.get(self.url)
+        self.assertIn("Last-Modified", response)
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+    def test_like_and_comment_change_etag(self):
+        """
+        Checks that a new like or comment changes the ETag of the list,
+        even though the post itself wasn't edited.
+        """
+        etag = self.client.get("/plants_blog/posts/")["ETag"]
+
+        Like.objects.create(
+            owner=self.normal_user, plant_in_focus_post=self.post
+        )
+        response = self.client.get(
+            "/plants_blog/posts/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        Comment.objects.create(
+            owner=self.normal_user,
+            plant_in_focus_post=self.post,
+            content="Hi",
+        )
+        response = self.client.get(
+            "/plants_blog/posts/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_moved_like_changes_etag(self):
+        """
+        Checks that a like moving from one post to another changes the
+        ETag, though the total, the number of posts and their newest
+        update stay the same.
+        """
+        other_post = PlantInFocusPost.objects.create(
+            main_plant_name="Nettle",
+            main_plant_month=4,
+            main_plant_environment="Woodland",
+            culinary_uses="Soup",
+            history_and_folklore="Folklore",
+            main_plant_parts_used="Leaves",
+        )
+        PlantInFocusPost.objects.filter(pk=self.post.pk).update(likes_count=1)
+        etag = self.client.get("/plants_blog/posts/")["ETag"]
+
+        PlantInFocusPost.objects.filter(pk=self.post.pk).update(likes_count=0)
+        PlantInFocusPost.objects.filter(pk=other_post.pk).update(
+            likes_count=1
+        )
+        response = self.client.get(
+            "/plants_blog/posts/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_own_like_changes_etag(self):
+        """
+        Checks that the requesting user's like changes the ETag they're
+        given, as the post's like_id does, while the counts are unchanged.
+        """
+        self.client.force_authenticate(user=self.normal_user)
+        etag = self.client.get(self.url)["ETag"]
+        Like.objects.create(
+            owner=self.normal_user, plant_in_focus_post=self.post
+        )
+        PlantInFocusPost.objects.filter(pk=self.post.pk).update(likes_count=0)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data["like_id"])
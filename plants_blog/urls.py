@@ -21,6 +21,12 @@ urlpatterns = [
         views.PlantInFocusPostList.as_view(),
         name="plant_posts",
     ),
+    # URL for viewing the list of PlantInFocus posts as compact cards.
+    path(
+        "posts/summary/",
+        views.PlantInFocusPostSummaryList.as_view(),
+        name="plant_post_summaries",
+    ),
     # URL for creating a new PlantInFocus post (restricted to admins).
     path(
         "posts/create/",
@@ -7,31 +7,66 @@ but only admins can update or delete them.
 Create View: Restricted to admin users only.
 """
 
-from django.db.models import Count
 from rest_framework import generics, filters
+from foraging_api.conditional import ConditionalGetMixin
+from likes.models import user_like_id
+from .filters import PlantInFocusPostSearchFilter
 from .models import PlantInFocusPost
-from .serializers import PlantInFocusPostSerializer
+from .serializers import (
+    PlantInFocusPostSerializer,
+    PlantInFocusPostSummarySerializer,
+)
 from rest_framework.permissions import AllowAny
 from foraging_api.permissions import IsAdminUserOrReadOnly
 
 
-class PlantInFocusPostList(generics.ListAPIView):
+class PlantInFocusPostValidatorsMixin(ConditionalGetMixin):
+    """
+    Conditional GET for the post views. The stored like and comment counts,
+    the authors' profiles and the requesting user's like are added to each
+    post's state in the ETag, as they're embedded in every post.
+    """
+
+    validator_fields = (
+        "updated_at",
+        "likes_count",
+        "comments_count",
+        "owner__profile__updated_at",
+    )
+
+    def get_validator_annotations(self):
+        if not self.request.user.is_authenticated:
+            return {}
+        return {
+            "like_id": user_like_id(self.request.user, "plant_in_focus_post")
+        }
+
+
+class PlantInFocusPostList(
+    PlantInFocusPostValidatorsMixin, generics.ListAPIView
+):
     """
     View for listing all PlantInFocusPosts.
     The posts are readable by all users, irrespective of whether they are
     authenticated or not.
+    Responses carry an ETag, so unchanged pages can be answered with a 304.
     """
 
     serializer_class = PlantInFocusPostSerializer
     permission_classes = [AllowAny]
-    queryset = PlantInFocusPost.objects.annotate(
-        comments_count=Count("comments", distinct=True),
-        likes_count=Count("likes", distinct=True),
-    ).order_by("-created_at")
+    # comments_count and likes_count are stored on the post, so a page of
+    # posts is read straight from the one table. The owner and profile are
+    # joined in for the profile_id and profile_image fields. The search
+    # vector is only needed by the database, so it isn't loaded.
+    queryset = (
+        PlantInFocusPost.objects.select_related("owner__profile")
+        .defer("search_vector")
+        .order_by("-created_at")
+    )
 
     filter_backends = [
         filters.OrderingFilter,
-        filters.SearchFilter,
+        PlantInFocusPostSearchFilter,
     ]
 
     ordering_fields = [
@@ -40,6 +75,8 @@ class PlantInFocusPostList(generics.ListAPIView):
         "comments_count",
     ]
 
+    # Used by the SQLite fallback. PostgreSQL searches the weighted
+    # search_vector built from the same fields.
     search_fields = [
         "main_plant_name",
         "main_plant_environment",
@@ -50,6 +87,29 @@ class PlantInFocusPostList(generics.ListAPIView):
     ]
 
 
+class PlantInFocusPostSummaryList(PlantInFocusPostList):
+    """
+    View for listing PlantInFocusPosts as compact cards, with the same
+    ordering and searching as PlantInFocusPostList.
+    Only the columns the cards need are loaded from the database, leaving the
+    long text fields behind.
+    """
+
+    serializer_class = PlantInFocusPostSummarySerializer
+    queryset = PlantInFocusPost.objects.only(
+        "id",
+        "main_plant_name",
+        "main_plant_month",
+        "main_plant_image",
+        "main_plant_image_derivatives",
+        "comments_count",
+        "likes_count",
+    ).order_by("-created_at")
+    # The cards don't show the author, so only the post's own columns go
+    # into the ETag, without joining the profiles.
+    validator_fields = ("updated_at", "likes_count", "comments_count")
+
+
 class PlantInFocusPostCreate(generics.CreateAPIView):
     """
     View for creating new PlantInFocusPosts.
@@ -64,17 +124,23 @@ class PlantInFocusPostCreate(generics.CreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class PlantInFocusPostDetail(generics.RetrieveUpdateDestroyAPIView):
+class PlantInFocusPostDetail(
+    PlantInFocusPostValidatorsMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """
     Handles retrieving, updating, and deleting a specific PlantInFocusPost.
     Allows any user to read the post details, but only admin users can update
     or delete posts.
+    Responses carry an ETag, so an unchanged post can be answered with a 304.
     """
 
-    queryset = PlantInFocusPost.objects.annotate(
-        comments_count=Count("comments", distinct=True),
-        likes_count=Count("likes", distinct=True),
-    ).order_by("-created_at")
+    # Loaded like the list: the owner and profile joined in, and the search
+    # vector left in the database.
+    queryset = (
+        PlantInFocusPost.objects.select_related("owner__profile")
+        .defer("search_vector")
+        .order_by("-created_at")
+    )
 
     serializer_class = PlantInFocusPostSerializer
     permission_classes = [IsAdminUserOrReadOnly]
@@ -0,0 +1,51 @@
+"""
+Ordering backend for the profile list.
+
+ProfileList used to offer "owner__followed__created_at" and
+"owner__following__created_at" orderings, which joined the followers table
+and gave one row per follow, so a popular profile came up again and again
+across the pages. Those orderings are now aliases for the last_followed_at
+and last_following_at timestamps stored on the profile, which sort with a
+single scan of their indexes and one row per profile.
+
+The stored times are null for users who were never followed, or never
+followed anyone. PostgreSQL sorts nulls first when descending, which put
+those users at the top of "recently followed", so the times are sorted
+with nulls last in either direction, matching the indexes.
+
+Those nulls, and equal counts, tie with each other, and rows that tie can
+come back in any order, so page-number pagination could repeat or skip a
+profile across pages. Every ordering therefore ends with the newest first
+"-created_at" and "-pk" to break the ties.
+"""
+
+from django.db.models import F
+from rest_framework import filters
+
+
+class ProfileOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that maps the orderings in the view's "ordering_aliases"
+    to the fields they stand for, keeping the direction and sorting nulls
+    last, and ends every ordering with the unique TIEBREAKER.
+    """
+
+    TIEBREAKER = ["-created_at", "-pk"]
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view) or []
+        aliases = getattr(view, "ordering_aliases", {})
+        ordering = [self.resolve_alias(term, aliases) for term in ordering]
+        return ordering + [
+            term for term in self.TIEBREAKER if term not in ordering
+        ]
+
+    def resolve_alias(self, term, aliases):
+        descending = term.startswith("-")
+        name = term.lstrip("-")
+        if name not in aliases and name not in aliases.values():
+            return term
+        field = F(aliases.get(name, name))
+        if descending:
+            return field.desc(nulls_last=True)
+        return field.asc(nulls_last=True)
@@ -0,0 +1,80 @@
+"""
+Management command that recalculates the stored total_comments_count,
+followers_count and following_count on every Profile, along with the
+last_followed_at and last_following_at follow times.
+
+The counters are normally kept correct by signal receivers, but rows that
+were changed outside of the ORM (raw SQL, bulk_create, restored backups) can
+leave them out of step. Profiles are processed in chunks ordered by primary
+key so a large table is never loaded into memory, or locked, all at once.
+
+Usage:
+    python manage.py rebuild_profile_counts --chunk-size 500
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from comments.models import Comment
+from followers.models import Follower, latest_follow
+from foraging_api.db import subquery_count
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the stored comments, followers and following counts, and "
+        "follow times, on profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of profiles recalculated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_pk = 0
+        total = 0
+
+        while True:
+            pks = list(
+                Profile.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not pks:
+                break
+
+            with transaction.atomic():
+                self.rebuild_chunk(pks)
+
+            total += len(pks)
+            last_pk = pks[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt profile counts for {total} profiles."
+            )
+        )
+
+    def rebuild_chunk(self, pks):
+        """
+        Recounts one chunk of profiles with a single UPDATE, each counter
+        and follow time set from its own correlated subquery.
+        """
+        Profile.objects.filter(pk__in=pks).update(
+            total_comments_count=subquery_count(
+                Comment.objects.all(), "owner", "owner"
+            ),
+            followers_count=subquery_count(
+                Follower.objects.all(), "followed", "owner"
+            ),
+            following_count=subquery_count(
+                Follower.objects.all(), "owner", "owner"
+            ),
+            last_followed_at=latest_follow("followed"),
+            last_following_at=latest_follow("owner"),
+        )
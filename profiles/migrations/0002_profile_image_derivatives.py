@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Names of the avatar thumbnails.', verbose_name='Image Derivatives'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_profile_counts(apps, schema_editor):
+    """
+    Fills in the new counters for profiles that already exist. Later drift
+    is handled by the "rebuild_profile_counts" management command.
+    """
+    Profile = apps.get_model('profiles', 'Profile')
+    Comment = apps.get_model('comments', 'Comment')
+    Follower = apps.get_model('followers', 'Follower')
+
+    def count_of(model, field):
+        counted = (
+            model.objects.filter(**{field: OuterRef('owner')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(counted), Value(0))
+
+    Profile.objects.update(
+        total_comments_count=count_of(Comment, 'owner'),
+        followers_count=count_of(Follower, 'followed'),
+        following_count=count_of(Follower, 'owner'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0002_profile_image_derivatives'),
+        ('comments', '0008_comment_likes_count'),
+        ('followers', '0003_remove_follower_unique_following'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of users following the user.', verbose_name='Followers Count'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of users the user follows.', verbose_name='Following Count'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='total_comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of comments the user has made.', verbose_name='Comments Count'),
+        ),
+        # Filled in before the indexes are built.
+        migrations.RunPython(
+            populate_profile_counts, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['total_comments_count'], name='profile_comments_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['followers_count'], name='profile_followers_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['following_count'], name='profile_following_count_idx'),
+        ),
+    ]
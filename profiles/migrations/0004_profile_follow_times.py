@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:46
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def populate_follow_times(apps, schema_editor):
+    """
+    Fills in the follow times for profiles that already exist.
+    """
+    Profile = apps.get_model('profiles', 'Profile')
+    Follower = apps.get_model('followers', 'Follower')
+
+    def latest_follow(field):
+        return Subquery(
+            Follower.objects.filter(**{field: OuterRef('owner')})
+            .order_by()
+            .values(field)
+            .annotate(latest=Max('created_at'))
+            .values('latest')
+        )
+
+    Profile.objects.update(
+        last_followed_at=latest_follow('followed'),
+        last_following_at=latest_follow('owner'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='last_followed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When another user last followed the user.', null=True, verbose_name='Last Followed At'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='last_following_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the user last followed another user.', null=True, verbose_name='Last Following At'),
+        ),
+        # Filled in before the indexes are built.
+        migrations.RunPython(
+            populate_follow_times, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['last_followed_at'], name='profile_last_followed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['last_following_at'], name='profile_last_following_idx'),
+        ),
+    ]
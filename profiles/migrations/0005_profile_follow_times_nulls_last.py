@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:15
+
+from django.db import migrations
+from foraging_api.db import RunSQLOnPostgreSQL
+
+# ProfileOrderingFilter sorts the follow times descending with nulls last,
+# while a plain index read backwards gives nulls first, so on PostgreSQL
+# the indexes are rebuilt in that order under the same names. SQLite can't
+# create NULLS LAST indexes and keeps the plain ones.
+FOLLOW_TIME_INDEXES = [
+    ('profile_last_followed_idx', 'last_followed_at'),
+    ('profile_last_following_idx', 'last_following_at'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_profile_follow_times'),
+    ]
+
+    operations = [
+        RunSQLOnPostgreSQL(
+            sql=[
+                f'DROP INDEX IF EXISTS {name};',
+                f'CREATE INDEX {name} ON profiles_profile '
+                f'({column} DESC NULLS LAST);',
+            ],
+            reverse_sql=[
+                f'DROP INDEX IF EXISTS {name};',
+                f'CREATE INDEX {name} ON profiles_profile ({column});',
+            ],
+        )
+        for name, column in FOLLOW_TIME_INDEXES
+    ]
@@ -9,6 +9,12 @@ new user is registered.
 from django.db import models
 from django.db.models.signals import post_save
 from django.contrib.auth.models import User
+from foraging_api.db import fields_to_update
+from foraging_api.images import AVATAR_SIZES
+from foraging_api.uploads import (
+    register_deferred_uploads,
+    register_derivatives,
+)
 
 
 class Profile(models.Model):
@@ -60,16 +66,112 @@ class Profile(models.Model):
         help_text="Profile image of the user. Defaults to generic image "
         "if one is not provided",
     )
+    # Square thumbnails of the avatar, keyed by size. Generated in the
+    # background when a new image is uploaded, see register_derivatives.
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Image Derivatives",
+        help_text="Names of the avatar thumbnails.",
+    )
+
+    # Stored counters, kept up to date by the Comment and Follower signal
+    # receivers in the same transaction as the row they count, so listing
+    # profiles doesn't count the comments and followers tables every time.
+    # "rebuild_profile_counts" puts them right if they ever drift.
+    total_comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Comments Count",
+        help_text="Number of comments the user has made.",
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Followers Count",
+        help_text="Number of users following the user.",
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Following Count",
+        help_text="Number of users the user follows.",
+    )
+
+    # When the user was last followed, and last followed someone, kept up
+    # to date by the Follower signal receivers. ProfileList sorts on these
+    # instead of joining the followers table, see profiles/filters.py.
+    last_followed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Last Followed At",
+        help_text="When another user last followed the user.",
+    )
+    last_following_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Last Following At",
+        help_text="When the user last followed another user.",
+    )
+
+    # Columns only written with queries of their own, which a save of an
+    # existing profile leaves alone.
+    STORED_FIELDS = (
+        "total_comments_count",
+        "followers_count",
+        "following_count",
+        "last_followed_at",
+        "last_following_at",
+    )
 
     class Meta:
         """
         Meta class for the model.
         Ensuring that the most recent profiles are listed first
+        The counters and activity timestamps are indexed for the
+        ProfileList orderings.
         """
 
         ordering = ["-created_at"]
         verbose_name = "Profile"
         verbose_name_plural = "Profiles"
+        indexes = [
+            models.Index(
+                fields=["total_comments_count"],
+                name="profile_comments_count_idx",
+            ),
+            models.Index(
+                fields=["followers_count"], name="profile_followers_count_idx"
+            ),
+            models.Index(
+                fields=["following_count"], name="profile_following_count_idx"
+            ),
+            # Rebuilt descending with nulls last on PostgreSQL, see
+            # migration 0005.
+            models.Index(
+                fields=["last_followed_at"],
+                name="profile_last_followed_idx",
+            ),
+            models.Index(
+                fields=["last_following_at"],
+                name="profile_last_following_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Saving an existing profile leaves out the stored counters and
+        follow times, so a profile loaded before a comment or follow came
+        in doesn't write the old values back.
+        """
+        if not self._state.adding:
+            kwargs["update_fields"] = fields_to_update(
+                self, self.STORED_FIELDS, kwargs.get("update_fields")
+            )
+        super().save(*args, **kwargs)
 
     # Returns information about the owner of the profile.
     def __str__(self):
@@ -88,3 +190,9 @@ def create_profile(sender, instance, created, **kwargs):
 
 
 post_save.connect(create_profile, sender=User)
+
+# New avatars are pushed to the storage backend in the background when
+# deferred uploads are switched on.
+register_deferred_uploads(Profile, "image")
+# The avatar thumbnails of new images are generated in the background.
+register_derivatives(Profile, "image", AVATAR_SIZES, square=True)
@@ -7,6 +7,12 @@ JSON format.
 """
 
 from rest_framework import serializers
+from foraging_api.images import (
+    AVATAR_SIZES,
+    ImageSrcsetField,
+    ImageUploadValidator,
+)
+from foraging_api.serializers import BatchedListSerializer
 from .models import Profile
 from followers.models import Follower
 
@@ -23,15 +29,52 @@ class ProfileSerializer(serializers.ModelSerializer):
     followers_count = serializers.ReadOnlyField()
     following_count = serializers.ReadOnlyField()
 
+    # Keeps avatars to 2MB and 512 pixels, an expected size for an avatar
+    # without compromising quality. Checked from the image header, without
+    # decoding the image.
+    image = serializers.FileField(
+        required=False,
+        validators=[
+            ImageUploadValidator("Image", max_width=512, max_height=512)
+        ],
+    )
+
+    # Avatar thumbnail URLs, keyed by size.
+    image_srcset = ImageSrcsetField("image", AVATAR_SIZES, source="*")
+
     def get_is_owner(self, obj):
         request = self.context["request"]
         return request.user == obj.owner
 
+    def resolve_page(self, profiles):
+        """
+        Fetches which of the page's profile owners the current user follows
+        in one query, and keeps the follow ids in the context, keyed by the
+        followed user's id, for get_following_id to read. Anonymous users
+        follow no one.
+        """
+        user = self.context["request"].user
+        if not user.is_authenticated:
+            return
+        following_ids = self.context.setdefault("following_ids", {})
+        owner_ids = [profile.owner_id for profile in profiles]
+        following_ids.update((owner_id, None) for owner_id in owner_ids)
+        following_ids.update(
+            Follower.objects.filter(owner=user, followed_id__in=owner_ids)
+            .order_by()
+            .values_list("followed_id", "id")
+        )
+
     def get_following_id(self, obj):
         """
         Returns the ID of the 'Follower' object if the logged-in user follows
         the profile's owner. If not, it returns 'None'.
+        Profiles on a list page are answered from the follows fetched by
+        resolve_page, a single profile is looked up on its own.
         """
+        following_ids = self.context.get("following_ids", {})
+        if obj.owner_id in following_ids:
+            return following_ids[obj.owner_id]
         # Gets the currently logged-in user.
         user = self.context["request"].user
         # Checks if the user is authenticated.
@@ -46,39 +89,14 @@ class ProfileSerializer(serializers.ModelSerializer):
             return following.id if following else None
         return None
 
-    def validate_image(self, value):
-        """
-        Validates the image being used as an avatar's size and dimensions,
-        raising a ValidationError message if the the image is outside the
-        size and dimentions expected.
-        """
-
-        # Ensure that file size is not over 2MB
-        if value.size > 2 * 1024 * 1024:
-            raise serializers.ValidationError("Image size cannot exceed 2MB.")
-
-        # Keeps image size to an expected size for an avatar without
-        # compromising quality.
-        if value.image.height > 512:
-            raise serializers.ValidationError(
-                "Image height cannot exceed 512 pixels."
-            )
-
-        # Keeps image size to an expected size for an avatar without
-        # compromising quality.
-        if value.image.width > 512:
-            raise serializers.ValidationError(
-                "Image width cannot exceed 512 pixels."
-            )
-
-        return value
-
     class Meta:
         """
         Specifies the model and fields that will be serialized.
         """
 
         model = Profile
+        # Looks up the following ids of a whole page of profiles at once.
+        list_serializer_class = BatchedListSerializer
         fields = [
             "id",
             "owner",
@@ -87,6 +105,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             "name",
             "content",
             "image",
+            "image_srcset",
             "is_owner",
             "following_id",
             "total_comments_count",
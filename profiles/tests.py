@@ -1,9 +1,42 @@
+import os
+import tempfile
+from io import BytesIO
+from unittest import mock
+from PIL import Image
+from io import StringIO
+from django.core.management import call_command
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
 from django.test import TestCase
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, APIRequestFactory
+from foraging_api.images import (
+    StorageURLCache,
+    StorageURLField,
+    url_cache,
+)
+from foraging_api.uploads import DeferredUploadStorage, UploadQueue
+from foraging_api.views import pending_upload
+from comments.models import Comment
+from followers.models import Follower
+from plants_blog.models import PendingUpload, PlantInFocusPost
 from .models import Profile
+from .serializers import ProfileSerializer
+
+
+def image_bytes(width, height, image_format="PNG"):
+    """
+    Returns an encoded image of noise, so it doesn't compress down to almost
+    nothing.
+    """
+    buffer = BytesIO()
+    Image.frombytes(
+        "RGB", (width, height), os.urandom(width * height * 3)
+    ).save(buffer, format=image_format)
+    return buffer.getvalue()
 
 
 class ProfileModelTestCase(TestCase):
@@ -75,6 +108,289 @@ class ProfileUpdateTestCase(TestCase):
         self.assertEqual(self.profile.content, "Updated Content")
 
 
+class ProfileCountsTestCase(TestCase):
+    """
+    Tests the comments, followers and following counts on profiles.
+    """
+
+    def setUp(self):
+        """
+        Creates three users. The first has three comments and follows the
+        second, and the second follows the first.
+        """
+        self.users = [
+            User.objects.create_user(
+                username=f"user_{number}", password="test_password"
+            )
+            for number in range(3)
+        ]
+        post = PlantInFocusPost.objects.create(
+            main_plant_name="Nettle",
+            main_plant_month=4,
+            main_plant_environment="Woodland",
+            culinary_uses="Soup",
+            history_and_folklore="Folklore",
+            main_plant_parts_used="Leaves",
+        )
+        for number in range(3):
+            Comment.objects.create(
+                owner=self.users[0],
+                plant_in_focus_post=post,
+                content=f"Comment {number}",
+            )
+        Follower.objects.create(owner=self.users[0], followed=self.users[1])
+        Follower.objects.create(owner=self.users[1], followed=self.users[0])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.users[2])
+
+    def test_counts_in_list_and_detail(self):
+        """
+        Checks each profile's counts, which come from subqueries rather
+        than one join over comments and followers.
+        """
+        response = self.client.get(reverse("profiles:profile_list"))
+        counts = {
+            profile["owner"]: (
+                profile["total_comments_count"],
+                profile["followers_count"],
+                profile["following_count"],
+            )
+            for profile in response.data["results"]
+        }
+        self.assertEqual(
+            counts,
+            {"user_0": (3, 1, 1), "user_1": (0, 1, 1), "user_2": (0, 0, 0)},
+        )
+
+        profile = self.users[0].profile
+        response = self.client.get(
+            reverse("profiles:profile_detail", kwargs={"pk": profile.pk})
+        )
+        self.assertEqual(response.data["total_comments_count"], 3)
+        self.assertEqual(response.data["followers_count"], 1)
+
+    def test_counts_follow_deletions(self):
+        """
+        Checks that deleting comments and follows takes them off the
+        stored counts.
+        """
+        Comment.objects.filter(owner=self.users[0]).first().delete()
+        Follower.objects.get(owner=self.users[0]).delete()
+        profile = Profile.objects.get(owner=self.users[0])
+        self.assertEqual(
+            (
+                profile.total_comments_count,
+                profile.followers_count,
+                profile.following_count,
+            ),
+            (2, 1, 0),
+        )
+        self.assertEqual(
+            Profile.objects.get(owner=self.users[1]).followers_count, 0
+        )
+
+    def test_saving_stale_profile_keeps_counts(self):
+        """
+        Checks that saving a profile loaded before a follow came in doesn't
+        write its old count and follow time back.
+        """
+        stale = Profile.objects.get(owner=self.users[2])
+        Follower.objects.create(owner=self.users[0], followed=self.users[2])
+
+        stale.name = "User Two"
+        stale.save()
+
+        profile = Profile.objects.get(owner=self.users[2])
+        self.assertEqual(profile.name, "User Two")
+        self.assertEqual(profile.followers_count, 1)
+        self.assertIsNotNone(profile.last_followed_at)
+
+    def test_rebuild_fixes_drift(self):
+        """
+        Checks that rebuild_profile_counts recounts profiles whose
+        counters were changed behind the signals' back.
+        """
+        Profile.objects.update(
+            total_comments_count=9, followers_count=9, following_count=9
+        )
+        call_command(
+            "rebuild_profile_counts", chunk_size=2, stdout=StringIO()
+        )
+        counts = dict(
+            (owner, (comments, followers, following))
+            for owner, comments, followers, following in (
+                Profile.objects.values_list(
+                    "owner__username",
+                    "total_comments_count",
+                    "followers_count",
+                    "following_count",
+                )
+            )
+        )
+        self.assertEqual(
+            counts,
+            {"user_0": (3, 1, 1), "user_1": (0, 1, 1), "user_2": (0, 0, 0)},
+        )
+
+    def test_ordering_by_stored_counts(self):
+        """
+        Checks that profiles can be ordered by their stored counts.
+        """
+        response = self.client.get(
+            reverse("profiles:profile_list"),
+            {"ordering": "-total_comments_count"},
+        )
+        self.assertEqual(response.data["results"][0]["owner"], "user_0")
+
+    def test_recently_followed_ordering(self):
+        """
+        Checks that the old "owner__followed__created_at" ordering sorts on
+        the stored follow time, listing each profile once however many
+        followers it has.
+        """
+        Follower.objects.create(owner=self.users[2], followed=self.users[0])
+        response = self.client.get(
+            reverse("profiles:profile_list"),
+            {"ordering": "-owner__followed__created_at"},
+        )
+        owners = [profile["owner"] for profile in response.data["results"]]
+        self.assertEqual(owners, ["user_0", "user_1", "user_2"])
+
+    def test_never_followed_profiles_sorted_last(self):
+        """
+        Checks that profiles with no follow time come last in both
+        directions, whatever order the database gives nulls.
+        """
+        Follower.objects.create(owner=self.users[2], followed=self.users[0])
+        response = self.client.get(
+            reverse("profiles:profile_list"),
+            {"ordering": "owner__followed__created_at"},
+        )
+        owners = [profile["owner"] for profile in response.data["results"]]
+        self.assertEqual(owners, ["user_1", "user_0", "user_2"])
+
+        response = self.client.get(
+            reverse("profiles:profile_list"),
+            {"ordering": "-last_following_at"},
+        )
+        owners = [profile["owner"] for profile in response.data["results"]]
+        self.assertEqual(owners, ["user_2", "user_1", "user_0"])
+
+    def test_pages_through_ties(self):
+        """
+        Checks that paging through profiles whose follow times and creation
+        times all tie lists each of them exactly once, newest pk first.
+        """
+        for number in range(3, 25):
+            User.objects.create_user(
+                username=f"user_{number}", password="test_password"
+            )
+        Profile.objects.update(
+            created_at=Profile.objects.get(owner=self.users[0]).created_at
+        )
+
+        owners = []
+        url = reverse("profiles:profile_list")
+        params = {"ordering": "-owner__followed__created_at"}
+        while url:
+            response = self.client.get(url, params)
+            owners.extend(
+                profile["owner"] for profile in response.data["results"]
+            )
+            url, params = response.data["next"], None
+
+        never_followed = owners[2:]
+        self.assertEqual(len(owners), 25)
+        self.assertEqual(len(set(owners)), 25)
+        self.assertEqual(
+            never_followed,
+            list(
+                Profile.objects.filter(last_followed_at__isnull=True)
+                .order_by("-pk")
+                .values_list("owner__username", flat=True)
+            ),
+        )
+
+    def test_follow_times_follow_deletions(self):
+        """
+        Checks that deleting the newest follow sets the follow time back to
+        the one before it, and to None when none are left.
+        """
+        first = Follower.objects.get(owner=self.users[1])
+        newest = Follower.objects.create(
+            owner=self.users[2], followed=self.users[0]
+        )
+        profile = Profile.objects.get(owner=self.users[0])
+        self.assertEqual(profile.last_followed_at, newest.created_at)
+
+        newest.delete()
+        profile.refresh_from_db()
+        self.assertEqual(profile.last_followed_at, first.created_at)
+        first.delete()
+        profile.refresh_from_db()
+        self.assertIsNone(profile.last_followed_at)
+
+
+class ProfileFollowingIdTestCase(TestCase):
+    """
+    Tests the following_id of the profiles on the list page.
+    """
+
+    def setUp(self):
+        """
+        Creates a user who follows the first of three other users.
+        """
+        self.user = User.objects.create_user(
+            username="follower", password="test_password"
+        )
+        self.others = [
+            User.objects.create_user(
+                username=f"user_{number}", password="test_password"
+            )
+            for number in range(3)
+        ]
+        self.follow = Follower.objects.create(
+            owner=self.user, followed=self.others[0]
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def following_ids(self):
+        response = self.client.get(reverse("profiles:profile_list"))
+        return {
+            profile["owner"]: profile["following_id"]
+            for profile in response.data["results"]
+        }
+
+    def test_following_ids(self):
+        """
+        Checks that only the followed user's profile has a following_id.
+        """
+        self.assertEqual(
+            self.following_ids(),
+            {
+                "follower": None,
+                "user_0": self.follow.id,
+                "user_1": None,
+                "user_2": None,
+            },
+        )
+
+    def test_constant_queries(self):
+        """
+        Checks that a longer page of profiles costs no more queries.
+        """
+        with self.assertNumQueries(3):
+            self.following_ids()
+        for number in range(3, 6):
+            user = User.objects.create_user(
+                username=f"user_{number}", password="test_password"
+            )
+            Follower.objects.create(owner=self.user, followed=user)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.following_ids()), 7)
+
+
 class ProfileDeleteTestCase(TestCase):
     """
     Tests if a profile is successfully deleted.
@@ -110,3 +426,342 @@ class ProfileDeleteTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         with self.assertRaises(Profile.DoesNotExist):
             Profile.objects.get(pk=self.profile.pk)
+
+
+class ProfileImageValidationTestCase(TestCase):
+    """
+    Tests that avatar uploads are validated from the image header.
+    """
+
+    def setUp(self):
+        """
+        Creates a user, whose profile the images are validated against.
+        """
+        self.user = User.objects.create_user(
+            username="test_user", password="test_password"
+        )
+        self.profile = Profile.objects.get(owner=self.user)
+        self.request = APIRequestFactory().get("/")
+        self.request.user = self.user
+
+    def make_upload(self, width, height, image_format="PNG"):
+        """
+        Returns an uploaded file holding a noisy image.
+        """
+        return SimpleUploadedFile(
+            f"avatar.{image_format.lower()}",
+            image_bytes(width, height, image_format),
+        )
+
+    def validate(self, upload):
+        serializer = ProfileSerializer(
+            self.profile,
+            data={"image": upload},
+            partial=True,
+            context={"request": self.request},
+        )
+        serializer.is_valid()
+        return serializer
+
+    def test_valid_image_reads_only_the_header(self):
+        """
+        Tests that a valid avatar passes, and that only a small part of it
+        was read to find its dimensions.
+        """
+        upload = self.make_upload(400, 300)
+        serializer = self.validate(upload)
+        self.assertEqual(serializer.errors, {})
+
+        header = serializer.validated_data["image"].image_header
+        self.assertEqual(
+            (header.format, header.width, header.height), ("PNG", 400, 300)
+        )
+        self.assertLess(header.bytes_read, upload.size // 10)
+
+    def test_large_dimensions_rejected(self):
+        """
+        Tests that an avatar taller than 512 pixels is rejected.
+        """
+        serializer = self.validate(self.make_upload(100, 600, "JPEG"))
+        self.assertEqual(
+            serializer.errors["image"],
+            ["Image height cannot exceed 512 pixels."],
+        )
+
+    def test_non_image_rejected(self):
+        """
+        Tests that a file that isn't an image is rejected.
+        """
+        upload = SimpleUploadedFile("avatar.png", b"not an image at all")
+        serializer = self.validate(upload)
+        self.assertEqual(
+            serializer.errors["image"],
+            ["Image must be a JPEG, PNG, GIF or WEBP image."],
+        )
+
+    def test_oversized_file_rejected_before_reading(self):
+        """
+        Tests that a file over 2MB is rejected from its size alone.
+        """
+        upload = SimpleUploadedFile(
+            "avatar.png", b"0" * (2 * 1024 * 1024 + 1)
+        )
+        with mock.patch("foraging_api.images.read_image_header") as read:
+            serializer = self.validate(upload)
+        read.assert_not_called()
+        self.assertEqual(
+            serializer.errors["image"], ["Image size cannot exceed 2MB."]
+        )
+
+
+class ProfileImageUploadTestCase(TestCase):
+    """
+    Tests that a new avatar gets its thumbnails generated, and that it's
+    staged in the database as pending and pushed to the storage backend
+    afterwards, using a local directory in place of Cloudinary.
+    """
+
+    def setUp(self):
+        """
+        Swaps the image field's storage for a deferred storage with a
+        temporary directory as its backend, and the upload queue for one
+        without a worker thread. The URL cache is emptied, as it may hold URLs from
+        the real storage.
+        """
+        self.user = User.objects.create_user(
+            username="test_user", password="test_password"
+        )
+        self.profile = Profile.objects.get(owner=self.user)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = FileSystemStorage(
+            location=os.path.join(directory.name, "backend"),
+            base_url="/backend/",
+        )
+        self.storage = DeferredUploadStorage(backend=self.backend)
+        self.queue = UploadQueue(start_worker=False)
+        for patcher in (
+            mock.patch.object(
+                Profile._meta.get_field("image"), "storage", self.storage
+            ),
+            mock.patch("foraging_api.uploads.upload_queue", self.queue),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        url_cache.clear()
+        self.addCleanup(url_cache.clear)
+
+    def save_image(self):
+        self.content = image_bytes(300, 200)
+        self.profile.image = SimpleUploadedFile("avatar.png", self.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+
+    def test_image_is_pending_until_pushed(self):
+        """
+        Tests that the saved image is served locally while it's pending,
+        then pushed to the backend, with the final name swapped into the
+        row and the local copy removed.
+        """
+        self.save_image()
+        pending_name = self.profile.image.name
+        self.assertEqual(pending_name, "pending/images/avatar.png")
+        self.assertEqual(
+            self.profile.image.url, "/media/pending/images/avatar.png"
+        )
+        self.assertFalse(self.backend.exists("images/avatar.png"))
+
+        self.queue.drain()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image.name, "images/avatar.png")
+        self.assertEqual(self.profile.image.url, "/backend/images/avatar.png")
+        self.assertFalse(self.storage.exists(pending_name))
+        with self.profile.image.open() as image:
+            self.assertEqual(image.read(), self.content)
+        self.assertEqual(
+            self.profile.image_derivatives,
+            {
+                "64": "images/derivatives/avatar_64.jpg",
+                "128": "images/derivatives/avatar_128.jpg",
+            },
+        )
+
+    def test_pending_name_fits_the_field(self):
+        """
+        Tests that the "pending/" prefix is counted towards the field's
+        max_length, so a long file name is shortened to fit.
+        """
+        max_length = Profile._meta.get_field("image").max_length
+        self.profile.image = SimpleUploadedFile(
+            "a" * (max_length - 10) + ".png", image_bytes(300, 200)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+        self.assertTrue(self.profile.image.name.startswith("pending/"))
+        self.assertLessEqual(len(self.profile.image.name), max_length)
+        self.profile.refresh_from_db()
+        self.assertTrue(self.storage.exists(self.profile.image.name))
+
+    def test_pending_image_served_from_the_database(self):
+        """
+        Tests that a pending image is staged in the database, where every
+        dyno can read it, and served from its URL until it's pushed.
+        """
+        self.save_image()
+        self.assertTrue(
+            PendingUpload.objects.filter(name="images/avatar.png").exists()
+        )
+        response = pending_upload(
+            APIRequestFactory().get(self.profile.image.url),
+            "images/avatar.png",
+        )
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response.content, self.content)
+
+        self.queue.drain()
+        self.assertFalse(PendingUpload.objects.exists())
+        with self.assertRaises(Http404):
+            pending_upload(APIRequestFactory().get("/"), "images/avatar.png")
+
+    def test_replaced_image_is_not_swapped_in(self):
+        """
+        Tests that an upload is discarded from the backend if the profile
+        was given another image before it was pushed.
+        """
+        self.save_image()
+        Profile.objects.filter(pk=self.profile.pk).update(
+            image="images/other.png"
+        )
+
+        self.queue.drain()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image.name, "images/other.png")
+        self.assertFalse(self.backend.exists("images/avatar.png"))
+
+    def test_thumbnails_are_square(self):
+        """
+        Tests that the avatar thumbnails are cropped square to each size.
+        """
+        self.save_image()
+        self.queue.drain()
+        self.profile.refresh_from_db()
+        for size, name in self.profile.image_derivatives.items():
+            with self.backend.open(name) as thumbnail:
+                with Image.open(thumbnail) as image:
+                    self.assertEqual(image.size, (int(size), int(size)))
+
+    def test_thumbnails_made_in_the_background(self):
+        """
+        Tests that saving a new avatar leaves its thumbnails to the upload
+        worker, and that replacing it deletes the old thumbnails.
+        """
+        self.save_image()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image_derivatives, {})
+        self.queue.drain()
+        self.profile.refresh_from_db()
+        self.assertEqual(len(self.profile.image_derivatives), 2)
+
+        self.save_image()
+        self.queue.drain()
+        self.profile.refresh_from_db()
+        # Only the new image's thumbnails are left.
+        thumbnails = self.backend.listdir("images/derivatives")[1]
+        self.assertEqual(
+            sorted(f"images/derivatives/{name}" for name in thumbnails),
+            sorted(self.profile.image_derivatives.values()),
+        )
+
+    def test_worker_updates_bump_updated_at(self):
+        """
+        Tests that swapping in the pushed name and the thumbnails moves the
+        profile's updated_at on, so the ETags built from it change.
+        """
+        self.save_image()
+        saved_at = Profile.objects.get(pk=self.profile.pk).updated_at
+        self.queue.drain()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image.name, "images/avatar.png")
+        self.assertGreater(self.profile.updated_at, saved_at)
+
+    def test_serialized_srcset(self):
+        """
+        Tests that image_srcset gives each thumbnail's URL, and falls back
+        to the original image for the default avatar, which has none.
+        """
+        request = APIRequestFactory().get("/")
+        request.user = self.user
+        data = ProfileSerializer(
+            self.profile, context={"request": request}
+        ).data
+        self.assertEqual(
+            data["image_srcset"],
+            {
+                "64": "/backend/images/default_avatar_pfb93f",
+                "128": "/backend/images/default_avatar_pfb93f",
+            },
+        )
+
+        self.save_image()
+        self.queue.drain()
+        self.profile.refresh_from_db()
+        data = ProfileSerializer(
+            self.profile, context={"request": request}
+        ).data
+        self.assertEqual(
+            data["image_srcset"],
+            {
+                "64": "/backend/images/derivatives/avatar_64.jpg",
+                "128": "/backend/images/derivatives/avatar_128.jpg",
+            },
+        )
+
+    def test_urls_cached_until_image_replaced(self):
+        """
+        Tests that the avatar's URL, as serialized for comments and posts,
+        is only built once, and that it's dropped from the cache when a new
+        image is uploaded and again when that's pushed.
+        """
+        field = StorageURLField()
+        with mock.patch.object(
+            self.backend, "url", wraps=self.backend.url
+        ) as url:
+            for _ in range(3):
+                self.assertEqual(
+                    field.to_representation(self.profile.image),
+                    "/backend/images/default_avatar_pfb93f",
+                )
+        url.assert_called_once_with("images/default_avatar_pfb93f")
+
+        self.save_image()
+        self.assertNotIn("images/default_avatar_pfb93f", url_cache._urls)
+        field.to_representation(self.profile.image)
+        self.assertIn("pending/images/avatar.png", url_cache._urls)
+
+        self.queue.drain()
+        self.assertNotIn("pending/images/avatar.png", url_cache._urls)
+
+
+class StorageURLCacheTestCase(TestCase):
+    """
+    Tests the bounded LRU behaviour of the storage URL cache.
+    """
+
+    def test_least_recently_used_dropped(self):
+        """
+        Tests that the least recently used URL is dropped when the cache
+        is full, and that a dropped URL is built again.
+        """
+        storage = mock.Mock()
+        storage.url.side_effect = lambda name: f"/media/{name}"
+        cache = StorageURLCache(maxsize=2)
+
+        cache.url(storage, "a.png")
+        cache.url(storage, "b.png")
+        cache.url(storage, "a.png")
+        cache.url(storage, "c.png")
+        self.assertEqual(list(cache._urls), ["a.png", "c.png"])
+
+        self.assertEqual(cache.url(storage, "b.png"), "/media/b.png")
+        self.assertEqual(storage.url.call_count, 4)
@@ -3,11 +3,11 @@ This file has been predominantly copied from the DRF-API walkthrough project
 with Code Institute.
 
 It defines the views for interacting with profiles, including listing profiles
-and retrieving detailed profile information with additional annotated fields.
+and retrieving detailed profile information with their stored counts.
 """
 
-from django.db.models import Count
-from rest_framework import generics, filters
+from rest_framework import generics
+from .filters import ProfileOrderingFilter
 from .models import Profile
 from .serializers import ProfileSerializer
 from foraging_api.permissions import IsOwnerOrReadOnly
@@ -18,40 +18,43 @@ from rest_framework.filters import SearchFilter
 class ProfileList(generics.ListAPIView):
     """
     View for listing all profiles. Retrieves all profiles from the database,
-    annotates them with comments count, followers count, and following count,
+    with their stored comments count, followers count, and following count,
     and serializes them for JSON response. Profiles can be ordered by specific
     fields and searched by name or content, allowing easier handling on the
     client side. Uses "IsAuthenticated" permission to ensure only
     authenticated users can view the profiles.
     """
 
-    # Gets all profiles and adds extra info like how many comments, followers,
-    # and people the user is following.
-    queryset = Profile.objects.annotate(
-        # Counts how many comments the user has made
-        total_comments_count=Count("owner__comment", distinct=True),
-        # Counts how many followers the user has
-        followers_count=Count("owner__followed", distinct=True),
-        # Counts how many users, this user follows
-        following_count=Count("owner__following", distinct=True),
-        # Sorts profiles by the date they were created
-    ).order_by("created_at")
+    # Gets all profiles. How many comments, followers, and people the user
+    # is following are stored on the profile. Sorts profiles by the date
+    # they were created
+    # The owners are joined in for their usernames.
+    queryset = Profile.objects.select_related("owner").order_by("created_at")
 
     # Only logged-in users can view the profiles
     permission_classes = [IsAuthenticated]
     # Specifies name of the serializer to be used
     serializer_class = ProfileSerializer
     # Filters for ordering and searching
-    filter_backends = [filters.OrderingFilter, SearchFilter]
+    filter_backends = [ProfileOrderingFilter, SearchFilter]
 
-    # Fields which can be used for the ordering the profiles
+    # Fields which can be used for the ordering the profiles. The counts and
+    # follow times are indexed columns.
     ordering_fields = [
         "total_comments_count",
         "followers_count",
         "following_count",
+        "last_followed_at",
+        "last_following_at",
         "owner__followed__created_at",
         "owner__following__created_at",
     ]
+    # The orderings that used to join the followers table, sorting on the
+    # stored follow times instead.
+    ordering_aliases = {
+        "owner__followed__created_at": "last_followed_at",
+        "owner__following__created_at": "last_following_at",
+    }
 
     # Fields that can be searched, such as user name and profile content
     search_fields = ["name", "content"]
@@ -59,8 +62,8 @@ class ProfileList(generics.ListAPIView):
 
 class ProfileDetail(generics.RetrieveUpdateDestroyAPIView):
     """
-    View for retrieving detailed profile information. Annotates the profile
-    with comments count, followers count, and following count, and serializes
+    View for retrieving detailed profile information, with the stored
+    comments count, followers count, and following count, and serializes
     the data for JSON response. Only the profile owner can update or delete
     their profile. Uses "IsOwnerOrReadOnly" permission, along with
     "IsAuthenticated" to prevent unauthorized users from viewing or modifying
@@ -69,13 +72,8 @@ class ProfileDetail(generics.RetrieveUpdateDestroyAPIView):
 
     # Only logged-in users can view, but only the owner can edit or delete
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
-    # Gets a specific profile with the aditional information of how many
-    # comments, followers,
-
-    queryset = Profile.objects.annotate(
-        total_comments_count=Count("owner__comment", distinct=True),
-        followers_count=Count("owner__followed", distinct=True),
-        following_count=Count("owner__following", distinct=True),
-    ).order_by("created_at")
+    # Gets a specific profile, with its stored comments, followers and
+    # following counts, and its owner joined in.
+    queryset = Profile.objects.select_related("owner").order_by("created_at")
 
     serializer_class = ProfileSerializer